@@ -0,0 +1,32 @@
+'''
+rotsedatamodel converts ROTSE MATCH structured files into FITS structured files.
+
+The top-level API is resolved on first use, so that importing rotsedatamodel
+does not import astropy and scipy.
+'''
+
+import importlib
+
+# name: submodule providing it.
+API = {
+    'multimatch2fits': '.match2fits',
+    'getmatch': '.match2fits',
+    'readfits': '.io.fitstools',
+    'verifyfits': '.verify',
+    'match2shm': '.shmtables',
+    'queryfits': '.query',
+    'batch2fits': '.batch',
+}
+
+
+def __getattr__(name):
+    if name not in API:
+        raise AttributeError("module {} has no attribute {}".format(__name__, name))
+    module = importlib.import_module(API[name], __name__)
+    # cached, so that later lookups do not go through importlib again.
+    globals()[name] = getattr(module, name)
+    return globals()[name]
+
+
+def __dir__():
+    return sorted(list(globals()) + list(API))
@@ -0,0 +1,104 @@
+from collections import namedtuple
+import os
+import re
+from .match2fits import imatch2fits
+
+# night (yymmdd), field and telescope (e.g. 1a, 3b) of a ROTSE product, e.g. 000409_xtetrans_1a_match.dat.
+MATCHNAME = re.compile(r'^(?P<night>\d{6})_(?P<field>[^_]+)_(?P<tele>\d[a-z])_')
+
+# coadd products carry -0 in their name, as in scripts/data_manage_M2.
+COADD = '-0'
+
+Group = namedtuple('Group', ['night', 'tele', 'coadd'])
+
+
+def matchgroup(datfile):
+    ''' identifies the night, telescope and kind of a MATCH structured file from its name.
+
+    Args:
+        datfile: path to MATCH structured file.
+
+    Returns:
+        Group of the file. coadd is True for coadd products, False for single epoch ones.
+    '''
+    filename = os.path.basename(datfile)
+    found = MATCHNAME.match(filename)
+    if found is None:
+        raise RuntimeError("Cannot find night and telescope in MATCH file name: {}".format(datfile))
+    return Group(found.group('night'), found.group('tele'), COADD in filename)
+
+
+def groupdir(outroot, group):
+    ''' computes the directory of the FITS files of a group, in the tree of scripts/data_manage_M2.
+
+    Returns:
+        outroot/rotse/tele/yy/mm/dd/prod, or outroot/rotse/tele/yy/mm/dd/coadd/prod for coadds.
+    '''
+    night = group.night
+    outdir = os.path.join(outroot, 'rotse', group.tele, night[:2], night[2:4], night[4:])
+    if group.coadd:
+        outdir = os.path.join(outdir, 'coadd')
+    return os.path.join(outdir, 'prod')
+
+
+def groupfiles(datfiles):
+    ''' groups MATCH structured files by night, telescope, and coadd vs single epoch.
+
+    Returns:
+        A dict of Group: list of paths, in the order given.
+    '''
+    groups = dict()
+    for datfile in datfiles:
+        groups.setdefault(matchgroup(datfile), []).append(datfile)
+    return groups
+
+
+def plan(datfiles, outroot):
+    ''' schedules the conversion of MATCH structured files into an organised tree.
+
+    Args:
+        datfiles: iterable of paths to MATCH structured files.
+        outroot: top directory of the organised tree.
+
+    Process:
+        Groups the files, and assigns each group its directory under outroot.
+        Orders the files longest job first: by decreasing size, coadds first among equal sizes.
+        Conversion time grows with file size, so starting the large coadd files first
+        avoids a long tail where the last of them runs alone on otherwise idle workers.
+
+    Returns:
+        List of (path, target directory) tuples, in the order they should be converted.
+    '''
+    jobs = []
+    for group, paths in groupfiles(datfiles).items():
+        outdir = groupdir(outroot, group)
+        for datfile in paths:
+            jobs.append((os.path.getsize(datfile), group.coadd, datfile, outdir))
+    jobs.sort(key=lambda job: (-job[0], not job[1]))
+    return [(datfile, outdir) for _, _, datfile, outdir in jobs]
+
+
+def batch2fits(datfiles, outroot, workers=None, processes=True, cache=None, policy=None, summary=False):
+    ''' converts MATCH structured files into the organised tree, coadd-aware and longest job first.
+
+    Args:
+        datfiles: iterable of paths to MATCH structured files. It is read fully to be scheduled.
+        outroot: top directory of the organised tree.
+        workers: optional number of workers converting files in parallel.
+        processes: if True, workers are processes, else threads.
+        cache: optional MatchCache of parsed MATCH structures.
+        policy: optional TypePolicy choosing the format of numbers. Defaults to FORCE_FMT.
+        summary: if True, a SUMMARY BinTableHDU of per-object aggregates is added to each FITS file.
+
+    Process:
+        Schedules the files with plan.
+        Creates the target directories.
+        Converts the files in the planned order with imatch2fits.
+
+    Returns:
+        Generator of ((path, target directory), path to the FITS file, error) tuples, as they complete.
+    '''
+    jobs = plan(datfiles, outroot)
+    for outdir in set(outdir for _, outdir in jobs):
+        os.makedirs(outdir, exist_ok=True)
+    return imatch2fits(jobs, workers=workers, processes=processes, cache=cache, policy=policy, summary=summary)
@@ -4,32 +4,160 @@ Created on Dec 20, 2017
 @author: daniel
 '''
 
-from .nptools import add_recarray_field
-from astropy.io import fits as pyfits
+import hashlib
+import json
+import os
+import numpy as np
+from .nptools import add_recarray_field, to_native
+from ..lazy import LazyModule
 
+pyfits = LazyModule('astropy.io.fits')
 
-def readfits(filepath):
+# bump when the layout of numpy exports changes, so that old exports are not used.
+NPY_FORMAT = 1
+
+
+def readfits(filepath, npy=False, cachedir=None, native=False):
     ''' creates a numpy based structure from a FITS file generated by match2fits.
 
     Args:
         filepath: path to FITS file.
+        npy: if True, prefers the native numpy export of the FITS file, see exportnpy.
+            The export is created when missing or out of date, and skipped when it cannot be written,
+            such as next to files of a read-only archive; prefer a cachedir for archive trees.
+        cachedir: optional directory of the numpy export. Defaults to the directory of filepath.
+        native: if True, the recarray is converted to native byte order once, while it is combined,
+            so that arithmetic on its fields does not swap bytes again. Exports are always native.
 
     Process:
+        If npy, loads the numpy export memory-mapped when it is valid.
         Opens FITS file and reads each of its BinTableHDUs.
         Uses add_recarray_field to create a combined recarray using the BinTableHDUs.
+        If npy, exports the recarray for the next reads.
 
     Returns:
         A numpy recarray.
     '''
+    if npy:
+        new_match = readnpy(filepath, cachedir)
+        if new_match is None:
+            try:
+                exportnpy(filepath, cachedir)
+            except OSError:
+                # the FITS file is still readable.
+                pass
+            else:
+                new_match = readnpy(filepath, cachedir)
+        if new_match is not None:
+            return new_match
+
     with pyfits.open(filepath, memmap=True) as hdus:
         match = hdus[1].data
         stat = hdus[2].data
         map_ = hdus[3].data
     stat_map = [('STAT', stat), ('MAP', map_)]
-    new_match = add_recarray_field(match, stat_map)
+    new_match = add_recarray_field(match, stat_map, native=native)
     return new_match
 
 
+def npypath(filepath, cachedir=None):
+    ''' computes the path of the numpy export of a FITS file.
+
+    Args:
+        filepath: path to FITS file.
+        cachedir: optional directory of the export. Defaults to the directory of filepath.
+
+    Returns:
+        Path of the npy file. Its validity record has the same path with .json appended.
+    '''
+    base = os.path.splitext(os.path.basename(filepath))[0]
+    if cachedir is None:
+        return os.path.join(os.path.dirname(os.path.abspath(filepath)), base + '.npy')
+    # files of different directories may share a name.
+    key = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()[:12]
+    return os.path.join(cachedir, '{}.{}.npy'.format(base, key))
+
+
+def _fitsstate(filepath):
+    st = os.stat(filepath)
+    return {'fits': os.path.abspath(filepath), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+            'format': NPY_FORMAT}
+
+
+def exportnpy(filepath, cachedir=None):
+    ''' exports a FITS file generated by match2fits as a native byte order npy file.
+
+    Args:
+        filepath: path to FITS file.
+        cachedir: optional directory of the export. Defaults to the directory of filepath.
+
+    Process:
+        Reads the FITS file with readfits, in native byte order.
+        Saves it as a single structured npy file, written aside and renamed into place.
+        Records the size and modification time of the FITS file, to detect out of date exports.
+
+    Returns:
+        Path to the npy file.
+    '''
+    state = _fitsstate(filepath)
+    match = readfits(filepath, native=True)
+    path = npypath(filepath, cachedir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmppath = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmppath, 'wb') as f:
+            np.save(f, match, allow_pickle=False)
+        os.replace(tmppath, path)
+        with open(tmppath, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmppath, path + '.json')
+    except OSError:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+    return path
+
+
+def readnpy(filepath, cachedir=None):
+    ''' loads the numpy export of a FITS file, memory-mapped, if it is valid.
+
+    Args:
+        filepath: path to FITS file.
+        cachedir: optional directory of the export. Defaults to the directory of filepath.
+
+    Returns:
+        A read only numpy recarray, or None if the export is missing or out of date.
+    '''
+    path = npypath(filepath, cachedir)
+    try:
+        with open(path + '.json', 'r') as f:
+            state = json.load(f)
+        if state != _fitsstate(filepath):
+            return None
+        match = np.load(path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError):
+        return None
+    return match.view(np.recarray)
+
+
+def readsummary(filepath):
+    ''' reads the SUMMARY table of a FITS file generated by match2fits with summary.
+
+    Args:
+        filepath: path to FITS file.
+
+    Process:
+        Opens FITS file and reads only its SUMMARY BinTableHDU.
+        Swaps its bytes to native byte order in place.
+
+    Returns:
+        A numpy recarray with one record per object.
+    '''
+    with pyfits.open(filepath, memmap=True) as hdus:
+        summary = np.array(hdus['SUMMARY'].data)
+    return to_native(summary).view(np.recarray)
+
+
 if __name__ == '__main__':
     import os
 
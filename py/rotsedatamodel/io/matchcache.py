@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# bump when the layout of cache entries changes, so that old entries are not used.
+CACHE_FORMAT = 1
+MANIFEST = 'manifest.json'
+
+
+class Uncacheable(Exception):
+    ''' raised when a parsed MATCH structure holds values that cannot be stored in the cache.
+    '''
+
+
+def content_key(filename, blocksize=1 << 20):
+    ''' computes the hash of the content of a file, used as its cache key.
+    '''
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update('rotsedatamodel-cache-{}'.format(CACHE_FORMAT).encode())
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dump(value, entrydir, files):
+    ''' stores value in entrydir as npy files and returns its manifest node.
+
+    Args:
+        value: dict, recarray, ndarray or scalar found in a parsed MATCH structure.
+        entrydir: directory of the cache entry.
+        files: list of the npy files already written, extended with new ones.
+
+    Returns:
+        A json serializable node describing value.
+    '''
+    def save(array):
+        filename = '{}.npy'.format(len(files))
+        np.save(os.path.join(entrydir, filename), array, allow_pickle=False)
+        files.append(filename)
+        return filename
+
+    if isinstance(value, dict):
+        return {'type': 'dict', 'items': [[key, _dump(item, entrydir, files)] for key, item in value.items()]}
+    if isinstance(value, np.recarray):
+        fields = []
+        for name in value.dtype.names:
+            # fields without a title are stored with a null title.
+            title = (value.dtype.fields[name][2:] or (None,))[0]
+            field = value[name]
+            if field.dtype.kind == 'O':
+                node = {'type': 'objects', 'items': [_dump(item, entrydir, files) for item in field.ravel()]}
+            else:
+                node = {'type': 'array', 'file': save(field)}
+            fields.append([name, title, node])
+        return {'type': 'recarray', 'shape': list(value.shape), 'fields': fields}
+    if isinstance(value, bytes):
+        return {'type': 'bytes', 'file': save(np.array(value))}
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind != 'O':
+            return {'type': 'array', 'file': save(value)}
+        if all(isinstance(item, bytes) for item in value.ravel()):
+            return {'type': 'bytes', 'file': save(value.astype(bytes))}
+        return {'type': 'objects', 'shape': list(value.shape),
+                'items': [_dump(item, entrydir, files) for item in value.ravel()]}
+    if isinstance(value, np.generic):
+        return {'type': 'scalar', 'file': save(np.array(value))}
+    raise Uncacheable("Cannot cache value of type {}".format(type(value)))
+
+
+def _objects(items, entrydir):
+    ''' rebuilds a flat object array from manifest nodes.
+    '''
+    value = np.empty(len(items), dtype=object)
+    for i, item in enumerate(items):
+        # assigned one by one, so that numpy does not merge same shaped arrays.
+        value[i] = _load(item, entrydir)
+    return value
+
+
+def _load(node, entrydir):
+    ''' rebuilds the value described by a manifest node, memory-mapping arrays.
+    '''
+    def load(filename):
+        return np.load(os.path.join(entrydir, filename), mmap_mode='c', allow_pickle=False)
+
+    kind = node['type']
+    if kind == 'dict':
+        return {key: _load(item, entrydir) for key, item in node['items']}
+    if kind == 'recarray':
+        shape = tuple(node['shape'])
+        values = []
+        dtype = []
+        for name, title, field in node['fields']:
+            key = name if title is None else (title, name)
+            if field['type'] == 'objects':
+                value = _objects(field['items'], entrydir)
+                dtype.append((key, object))
+            else:
+                value = load(field['file'])
+                dtype.append((key, value.dtype, value.shape[len(shape):]))
+            values.append((name, value))
+        rec = np.recarray(shape, dtype=dtype)
+        for name, value in values:
+            rec[name] = value.reshape(shape + rec[name].shape[len(shape):])
+        return rec
+    if kind == 'objects':
+        return _objects(node['items'], entrydir).reshape(node['shape'])
+    if kind == 'bytes':
+        value = load(node['file'])
+        if value.ndim == 0:
+            return value[()]
+        return value.astype(object)
+    if kind == 'scalar':
+        return load(node['file'])[()]
+    return load(node['file'])
+
+
+class MatchCache(object):
+    ''' on disk cache of parsed MATCH structures, keyed by the content of the MATCH files.
+
+    Each entry is a directory of npy files, one per array of the structure, that are
+    memory-mapped when the entry is used. When the cache grows over max_bytes,
+    the least recently used entries are evicted.
+    '''
+
+    def __init__(self, cachedir, max_bytes=None):
+        self.cachedir = cachedir
+        self.max_bytes = max_bytes
+        os.makedirs(cachedir, exist_ok=True)
+
+    def entries(self):
+        ''' lists the cache entries.
+
+        Returns:
+            A list of (last use time, size in bytes, entry path) tuples, least recently used first.
+        '''
+        entries = []
+        for name in os.listdir(self.cachedir):
+            entrydir = os.path.join(self.cachedir, name)
+            if name.startswith('.') or not os.path.isdir(entrydir):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entrydir))
+                entries.append((os.stat(entrydir).st_mtime, size, entrydir))
+            except FileNotFoundError:
+                # evicted by another process
+                pass
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        ''' removes least recently used entries until the cache fits in max_bytes.
+
+        Args:
+            keep: optional entry path that must not be removed.
+        '''
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entrydir in entries:
+            if total <= self.max_bytes:
+                break
+            if entrydir == keep:
+                continue
+            shutil.rmtree(entrydir, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        ''' removes all the cache entries.
+        '''
+        for _, _, entrydir in self.entries():
+            shutil.rmtree(entrydir, ignore_errors=True)
+
+    def store(self, key, fdat):
+        ''' stores a parsed MATCH structure as the entry of key.
+
+        Process:
+            Writes the npy files and manifest into a temporary directory.
+            Renames the directory into place, so readers never see a partial entry.
+            Evicts least recently used entries.
+
+        Returns:
+            Path of the entry, or None if fdat could not be cached.
+        '''
+        entrydir = os.path.join(self.cachedir, key)
+        tmpdir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cachedir)
+        try:
+            manifest = _dump(fdat, tmpdir, [])
+            with open(os.path.join(tmpdir, MANIFEST), 'w') as f:
+                json.dump(manifest, f)
+            os.rename(tmpdir, entrydir)
+        except Uncacheable:
+            return None
+        except OSError:
+            # another process stored the same entry first
+            if not os.path.isdir(entrydir):
+                raise
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+        self.evict(keep=entrydir)
+        return entrydir
+
+    def load(self, key):
+        ''' loads the entry of key, marking it as recently used.
+
+        Returns:
+            The parsed MATCH structure, or None if key is not in the cache.
+        '''
+        entrydir = os.path.join(self.cachedir, key)
+        try:
+            with open(os.path.join(entrydir, MANIFEST), 'r') as f:
+                manifest = json.load(f)
+            os.utime(entrydir)
+            return _load(manifest, entrydir)
+        except FileNotFoundError:
+            return None
+
+    def get(self, filename, parse):
+        ''' fetches the parsed MATCH structure of filename, parsing and storing it if missing.
+
+        Args:
+            filename: path to MATCH structured file.
+            parse: function parsing filename when it is not in the cache.
+
+        Returns:
+            The parsed MATCH structure.
+        '''
+        key = content_key(filename)
+        fdat = self.load(key)
+        if fdat is None:
+            fdat = parse(filename)
+            self.store(key, fdat)
+        return fdat
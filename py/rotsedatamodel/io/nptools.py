@@ -4,6 +4,7 @@ Created on Dec 19, 2017
 @author: Daniel
 '''
 
+import hashlib
 import numpy as np
 
 
@@ -29,7 +30,7 @@ def case_insensative_recarray(dtype):
     return np.dtype(ndtype)
 
 
-def add_recarray_field(recarray, narr):
+def add_recarray_field(recarray, narr, native=False):
     ''' append new field in a recarray
 
     Args:
@@ -37,12 +38,14 @@ def add_recarray_field(recarray, narr):
         narr: A list of tuples (name, array)
             name : (str) name of field to be appended
             array : numpy array or recarray to be appended
+        native: if True, the new recarray is in native byte order.
 
     Process:
         Creates a list of dtypes corresponding to fields narr.
-        Creates an empty recarray with old and new fields.
+        Creates an empty recarray with old and new fields, in native byte order if native.
         Copies fields of source recarray into the new recarray.
         Copies new fields into the new recarray.
+        Copying into native byte order fields swaps the bytes, so no further copy is needed.
 
     Returns:
         numpy recarray appended
@@ -60,6 +63,8 @@ def add_recarray_field(recarray, narr):
 
     # create new empty recarray based on source, with added new field
     newdtype = np.dtype(base_dtype.descr + newfields)
+    if native:
+        newdtype = newdtype.newbyteorder('=')
     newrec = np.empty(recarray.shape, dtype=newdtype)
 
     # copy source fields to new recarray
@@ -76,6 +81,81 @@ def add_recarray_field(recarray, narr):
     return newrec
 
 
+def byteorders(dtype):
+    ''' collects the byte orders of the fields of a dtype, drilling into sub-arrays and nested fields.
+    numpy's dtype.isnative does not look into sub-arrays of structured dtypes.
+
+    Returns:
+        A set of booleans, True for native byte order fields and False for swapped ones.
+    '''
+    if dtype.names is not None:
+        orders = set()
+        for name in dtype.names:
+            orders |= byteorders(dtype.fields[name][0])
+        return orders
+    if dtype.subdtype is not None:
+        return byteorders(dtype.subdtype[0])
+    if dtype.byteorder == '|':
+        return set()
+    return {dtype.isnative}
+
+
+def to_native(array):
+    ''' converts an array to native byte order, in place when it is writable.
+
+    Args:
+        array: numpy ndarray or recarray, such as FITS data, which is big endian.
+
+    Process:
+        Arrays already in native byte order are returned as is.
+        Writable arrays with only swapped fields have their bytes swapped in place
+        and are viewed with the swapped dtype.
+        Other arrays, such as read only memory-mapped FITS data, are copied in native byte order.
+
+    Returns:
+        The array in native byte order.
+    '''
+    orders = byteorders(array.dtype)
+    if False not in orders:
+        return array
+    if array.flags.writeable and True not in orders:
+        array.byteswap(inplace=True)
+        return array.view(array.dtype.newbyteorder('S'))
+    return array.astype(array.dtype.newbyteorder('='))
+
+
+def array_digest(array):
+    ''' computes a digest of the content of a numpy array that survives the round trip to FITS.
+
+    Args:
+        array: numpy ndarray of numbers or strings.
+
+    Process:
+        Strings are encoded and stripped of trailing spaces, since FITS pads them with spaces,
+        and are brought to the width of their longest element.
+        Numbers are brought to little endian byte order, since FITS stores them as big endian.
+        Hashes the dtype, the shape and the raw buffer of the array in a single pass.
+
+    Returns:
+        Hexadecimal digest string.
+    '''
+    arr = np.asarray(array)
+    if arr.dtype.kind in 'US':
+        if arr.dtype.kind == 'U':
+            arr = np.char.encode(arr, 'utf-8')
+        arr = np.char.rstrip(arr)
+        width = int(np.char.str_len(arr).max()) if arr.size else 0
+        arr = arr.astype('S{}'.format(max(width, 1)))
+    elif arr.dtype.byteorder != '|':
+        arr = arr.astype(arr.dtype.newbyteorder('<'), copy=False)
+    arr = np.ascontiguousarray(arr)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(arr.dtype.str.encode())
+    digest.update(str(arr.shape).encode())
+    digest.update(arr.reshape(-1).view(np.uint8))
+    return digest.hexdigest()
+
+
 if __name__ == '__main__':
     x = np.array([(1.0, 2), (3.0, 4)], dtype=[('x', float), ('y', int)])
     y = [('a', (20, 10)), ('b', (30, 50))]
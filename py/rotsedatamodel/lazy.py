@@ -0,0 +1,21 @@
+import importlib
+
+
+class LazyModule(object):
+    ''' stands for a module that is imported on first attribute access.
+
+    Heavy dependencies, such as astropy and scipy, are referenced through LazyModule
+    so that importing rotsedatamodel only pays for what is used.
+    '''
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return "<LazyModule '{}'>".format(self._name)
@@ -6,11 +6,12 @@ Created on Nov 26, 2017
 
 # STAT is not a recarray, but a 1d ndarray
 
-from astropy.io import fits as pyfits
-from scipy.io import readsav
-from astropy.io.fits.column import _dtype_to_recformat
 import numpy as np
-from functools import reduce
+from .io.nptools import array_digest
+from .lazy import LazyModule
+from .parallel import imap_bounded
+from functools import reduce, partial
+import fnmatch
 import operator
 import os
 
@@ -18,7 +19,11 @@ import os
 # mul: multiplies the elements of a list.
 mul = lambda x: reduce(operator.mul, x, 1)
 
-NUMPY2FITS = pyfits.column.NUMPY2FITS
+pyfits = LazyModule('astropy.io.fits')
+scipy_io = LazyModule('scipy.io')
+
+# header keyword prefix of per-column digests, e.g. TDIG1 for the first column.
+DIGEST_KEY = 'TDIG'
 
 
 def bytes2str(b):
@@ -39,18 +44,28 @@ def bytes2str(b):
         return b
 
 
-def getfile(filename):
+def readsav(filename):
+    ''' parses a MATCH structured filename with scipy.
+    '''
+    return scipy_io.readsav(filename, python_dict=True)
+
+
+def getfile(filename, cache=None):
     ''' Reads a MATCH structured filename into numpy array as dict.
+    If cache, a MatchCache, is provided, the parsed structure is fetched from or stored in it.
     '''
-    fdat = readsav(filename, python_dict=True)
+    if cache is not None:
+        return cache.get(filename, readsav)
+    fdat = readsav(filename)
     return fdat
 
 
-def getmatch(filename):
+def getmatch(filename, cache=None):
     ''' fetches the 'match' field within a MATCH structured file.
 
     Args:
         filename: path to MATCH structured file.
+        cache: optional MatchCache of parsed MATCH structures.
 
     Process:
         Reads the MATCH structured file.
@@ -60,18 +75,19 @@ def getmatch(filename):
     Returns:
         The 'match' field within the file.
     '''
-    fdat = getfile(filename)
+    fdat = getfile(filename, cache=cache)
     assert isinstance(fdat, dict), "Received non-dict match structure. Make sure the use of python_dict when reading match files"
     rmatch = fdat['match']
     return rmatch
 
 
-def recarray2bin(rec):
+def recarray2bin(rec, policy=None):
     ''' combines recarray fields into columns within a FITS BinTableHDU.
     fields that are recarray themselves are converted to a separate BinTableHDU.
 
     Args:
         rec: numpy recarray.
+        policy: optional TypePolicy choosing the format of numbers.
 
     Process:
         Scans the fields within the recarray.
@@ -85,7 +101,7 @@ def recarray2bin(rec):
     bins = []
     for field in rec.dtype.names:
         data = rec[field]
-        result = field2column(data, field)
+        result = field2column(data, field, policy)
         if isinstance(result, pyfits.Column):
             columns.append(result)
         else:
@@ -115,15 +131,124 @@ FORCE_FMT = {
     'DECC': 'D',
 }
 
+# narrower FITS formats that a TypePolicy with downcast may use for fields not in its fields.
+DOWNCAST = {
+    'D': 'E',
+    'K': 'J',
+}
+
+
+# number of elements checked at a time by fits_cast, bounding its temporary arrays.
+CAST_CHUNK = 1 << 16
+
+
+def fits_cast(data, fmt):
+    ''' casts a numeric array to a FITS format if its values allow it.
+
+    Args:
+        data: numpy ndarray of booleans, integers or floats.
+        fmt: target FITS format, one of B, I, J, K, E, D.
+
+    Process:
+        Integer targets require values that are finite, integral and within the range of the target.
+        Float targets require finite values within the range of the target,
+        and integers small enough to be represented exactly.
+        Float values are checked CAST_CHUNK elements at a time, so that the masks and copies
+        the checks need stay small. Only the cast itself, and flattening data if it is not contiguous,
+        allocate arrays of the size of data.
+
+    Returns:
+        The cast array, or None if the cast is not safe.
+    '''
+    if fmt not in 'BIJKED' or data.dtype.kind not in 'biuf':
+        return None
+    target = np.dtype(pyfits.column.FITS2NUMPY[fmt])
+    if data.size == 0 or data.dtype.kind == 'b':
+        return data.astype(target, copy=False)
+
+    if data.dtype.kind == 'f':
+        flat = data.reshape(-1)
+        vmin, vmax = np.inf, -np.inf
+        for start in range(0, flat.size, CAST_CHUNK):
+            chunk = flat[start:start + CAST_CHUNK]
+            finite = np.isfinite(chunk)
+            if target.kind in 'iu' and not (finite.all() and np.array_equal(np.trunc(chunk), chunk)):
+                return None
+            vmin = min(vmin, chunk.min(where=finite, initial=np.inf))
+            vmax = max(vmax, chunk.max(where=finite, initial=-np.inf))
+    else:
+        vmin, vmax = data.min(), data.max()
+
+    if target.kind in 'iu':
+        limits = np.iinfo(target)
+        low, high = limits.min, limits.max
+    elif data.dtype.kind in 'iu':
+        # largest integer represented exactly
+        high = 2 ** (np.finfo(target).nmant + 1)
+        low = -high
+    else:
+        limits = np.finfo(target)
+        low, high = limits.min, limits.max
+    if vmin < low or vmax > high:
+        return None
+    return data.astype(target, copy=False)
+
+
+class TypePolicy(object):
+    ''' chooses the FITS format of numeric columns.
+
+    Args:
+        fields: dict of field name: FITS format. Defaults to FORCE_FMT.
+        downcast: optional dict of FITS format: narrower FITS format, such as DOWNCAST,
+            applied to fields that are not in fields.
+        widen: if True, formats wider than the values' own, such as D for float32 fields of FORCE_FMT,
+            are applied too. By default they are skipped, so that a policy never grows the output.
+
+    Formats are only applied when fits_cast finds the values fit. Otherwise the column keeps its format.
+    Narrowing floats keeps about 7 significant digits, so fields needing more, such as times,
+    should be pinned to D in fields when downcast is used.
+    '''
+
+    def __init__(self, fields=None, downcast=None, widen=False):
+        self.fields = FORCE_FMT if fields is None else fields
+        self.downcast = downcast or dict()
+        self.widen = widen
+
+    def target(self, name, ftype):
+        ''' preferred FITS format of field name, given its current format ftype.
+        '''
+        return self.fields.get(name.upper(), self.downcast.get(ftype, ftype))
+
+    def apply(self, data, ftype, name):
+        ''' casts data to the preferred FITS format of name.
+
+        Returns:
+            FITS format and data, cast if the preferred format was applied.
+        '''
+        target = self.target(name, ftype)
+        if target != ftype and target in pyfits.column.FITS2NUMPY:
+            if not self.widen and np.dtype(pyfits.column.FITS2NUMPY[target]).itemsize > data.dtype.itemsize:
+                return ftype, data
+            converted = fits_cast(data, target)
+            if converted is not None:
+                return target, converted
+        return ftype, data
+
+
+DEFAULT_POLICY = TypePolicy()
+
 
-def numpy2fits(obj, name):
+def numpy2fits(obj, name, policy=None):
     ''' converts a dtype string into its corresponding fits format type.
 
     Args:
         obj: numpy ndarray.
+        name: name of the field of obj.
+        policy: optional TypePolicy. Defaults to DEFAULT_POLICY, honouring FORCE_FMT.
 
     Process:
         Uses NUMPY2FITS mapping to fetch the corresponding format.
+        Applies the preferred format of the policy to numbers.
         If it fails it tries to convert an object to a string,
         or recursively takes the first element of a ndarray.
         When converting bytes, objects are transformed into strings.
@@ -133,11 +258,10 @@ def numpy2fits(obj, name):
     '''
     fmt = obj.dtype
     dtype = str(fmt)
-    dtype = _dtype_to_recformat(dtype)[0]
+    dtype = pyfits.column._dtype_to_recformat(dtype)[0]
 
     try:
-        ftype = NUMPY2FITS[dtype]
-        # ftype = FORCE_FMT.get(name, ftype)
+        ftype = pyfits.column.NUMPY2FITS[dtype]
     except Exception as e:
         if dtype.startswith('O'):
             ftype = 'A'
@@ -145,27 +269,69 @@ def numpy2fits(obj, name):
             obj = vfunct(obj)
         elif isinstance(obj, np.ndarray):
             index = [0] * len(obj.shape)
-            ftype, obj = numpy2fits(obj[tuple(index)], name)
+            ftype, obj = numpy2fits(obj[tuple(index)], name, policy)
         else:
             raise RuntimeError("Failed NUMPY2FITS dtype: {}".format(dtype)) from e
+    else:
+        policy = DEFAULT_POLICY if policy is None else policy
+        ftype, obj = policy.apply(obj, ftype, name)
     return ftype, obj
 
 
 def A_size(obj):
     ''' Calculates size associated with a string in a nested ndarray, the FITS format A.
+
+    Args:
+        obj: ndarray of strings, or of objects holding strings.
+
+    Process:
+        Converts the strings to bytes, encoding text as utf-8, since A counts bytes, not characters.
+        Computes the length of all the strings in a single numpy operation and takes the longest,
+        so that no string of the column is truncated.
+
+    Returns:
+        Length in bytes of the longest string, at least 1.
+    '''
+    arr = np.asarray(obj)
+    if arr.size == 0:
+        return 1
+    if arr.dtype.kind == 'O':
+        try:
+            arr = arr.astype(np.bytes_)
+        except UnicodeEncodeError:
+            arr = arr.astype(np.str_)
+    if arr.dtype.kind == 'U':
+        arr = np.char.encode(arr, 'utf-8')
+    return max(int(np.char.str_len(arr).max()), 1)
+
+
+def column_data(data, name, policy=None):
+    ''' brings a numpy ndarray that is a field of recarray to the FITS format and data of its column.
+
+    Args:
+        data: ndarray of simple elements or an unidimensional ndarray of ndarrays of simple elements
+        name: name of the recarray field associated with the data.
+        policy: optional TypePolicy choosing the format of numbers.
+
+    Returns:
+        FITS format type and the data of the column.
     '''
-    if isinstance(obj, np.ndarray):
-        index = [0] * len(obj.shape)
-        return A_size(obj[tuple(index)])
-    return len(obj)
+    if isinstance(data[0], np.ndarray):
+        data = np.array([i for i in data])
+
+    try:
+        return numpy2fits(data, name, policy)
+    except Exception as e:
+        raise RuntimeError("Failed to create column: {}; {}".format(name, str(data.dtype))) from e
 
 
-def array2column(data, name):
+def array2column(data, name, policy=None):
     ''' converts a numpy ndarray that is a field of recarray into a FITS Column.
 
     Args:
         data: ndarray of simple elements or an unidimensional ndarray of ndarrays of simple elements
         name: name of the recarray field associated with the data.
+        policy: optional TypePolicy choosing the format of numbers.
 
     Process:
         Identify if the ndarray is nested.
@@ -177,13 +343,7 @@ def array2column(data, name):
     Returns:
         Newly generated FITS column.
     '''
-    if isinstance(data[0], np.ndarray):
-        data = np.array([i for i in data])
-
-    try:
-        ftype, data = numpy2fits(data, name)
-    except Exception as e:
-        raise RuntimeError("Failed to create column: {}; {}".format(name, str(data.dtype))) from e
+    ftype, data = column_data(data, name, policy)
 
     if ftype == "A":
         factor = A_size(data)
@@ -221,12 +381,13 @@ def array2column(data, name):
     return column
 
 
-def field2column(value, name):
+def field2column(value, name, policy=None):
     ''' Converts a recarray field into a FITS column or BinTableHDU.
 
     Args:
         value: field of a recarray.
         name: name of value.
+        policy: optional TypePolicy choosing the format of numbers.
 
     Process:
         If value contains a recarray nested in a ndarray, it uses recarray2bin to create a BinTableHDU.
@@ -236,14 +397,42 @@ def field2column(value, name):
         Newly generated FITS column or BinTableHDU.
     '''
     if isinstance(value[0], np.recarray):
-        result = recarray2bin(value[0])
+        result = recarray2bin(value[0], policy)
     else:
-        result = array2column(data=value, name=name)
+        result = array2column(data=value, name=name, policy=policy)
     return result
 
 
+def recarray_digests(rec, policy=None):
+    ''' computes the digests cols2hdu stores for a recarray, without creating FITS columns and tables.
+
+    Args:
+        rec: numpy recarray.
+        policy: optional TypePolicy choosing the format of numbers.
+
+    Process:
+        Scans the fields within the recarray in the order of recarray2bin.
+        Computes the digest of the column data of each field that is not a recarray.
+        Fields that are recarrays are scanned into their own list.
+
+    Returns:
+        A list, per BinTableHDU that recarray2bin creates, of (column name, digest) tuples.
+    '''
+    digests = []
+    bins = []
+    for field in rec.dtype.names:
+        data = rec[field]
+        if isinstance(data[0], np.recarray):
+            bins.extend(recarray_digests(data[0], policy))
+        else:
+            _, cdata = column_data(data, field, policy)
+            digests.append((field, array_digest(cdata)))
+    return [digests] + bins
+
+
 def cols2hdu(columns):
     ''' Converts FITS columns into a BinTableHDU.
+    The digest of each column is stored in the header as TDIGn, to be used by verifyfits.
     '''
     for column in columns:
         try:
@@ -251,19 +440,25 @@ def cols2hdu(columns):
         except Exception:
             print('Failed at {}'.format(column.name))
     fits = pyfits.BinTableHDU.from_columns(columns=columns)
+    for i, column in enumerate(columns, 1):
+        keyword = '{}{}'.format(DIGEST_KEY, i)
+        fits.header[keyword] = (array_digest(column.array), 'digest of {}'.format(column.name))
     return fits
 
 
-def bins2hdulist(match):
+def bins2hdulist(match, policy=None, summary=False):
     ''' creates a HDUList of all BinTableHDUs.
-    
+
     Args:
         match: field of recarray
+        policy: optional TypePolicy choosing the format of numbers.
+        summary: if True, appends a SUMMARY BinTableHDU of per-object aggregates.
 
     Process:
         Creates a PrimaryHDU header with a comment.
         Creates the BinTableHDU from match.
         Combines the Primary HDU with the BinTableHDUs into a list.
+        Optionally appends the SUMMARY BinTableHDU after all the others.
         Creates a HDUList of all the tables.
 
     Returns:
@@ -273,27 +468,23 @@ def bins2hdulist(match):
     prihdu = pyfits.PrimaryHDU(header=prihdr)
     prihdr['COMMENT'] = "Automatic convertion of MATCH to FITS."
 
-    bins = recarray2bin(match)
+    bins = recarray2bin(match, policy)
     bins = [prihdu] + bins
+    if summary:
+        from .summary import summary2hdu
+        bins.append(summary2hdu(match))
 
     hdulist = pyfits.HDUList(bins)
     return hdulist
 
 
-def match2fits(datfile, fitspath=None):
-    ''' converts a file with MATCH structure into a FITS structured file.
+def fitsname(datfile, fitspath=None):
+    ''' computes the path of the FITS file to be created from a MATCH structured file.
 
     Args:
         datfile: path to MATCH structured file.
         fitspath: optional path or target directory of file to be created. Defaults to datfile.fit.
 
-    Process:
-        Compute the target FITS file's default name.
-        Compose the target FITS file from the name of the MATCH file.
-        Loads the MATCH structured file into numpy structures.
-        Creates FITS BinTableHDUs from recarrays and columns for ndarrays.
-        Saves the BinTableHDUs into a FITS file.
-
     Returns:
         Path to the FITS file.
     '''
@@ -314,22 +505,49 @@ def match2fits(datfile, fitspath=None):
         filename = os.path.basename(datfile)
         fitsname = fitsname2match(filename)
         fitspath = os.path.join(fitspath, fitsname)
+    return fitspath
+
+
+def match2fits(datfile, fitspath=None, cache=None, policy=None, summary=False):
+    ''' converts a file with MATCH structure into a FITS structured file.
 
-    m = getmatch(datfile)
-    thdulist = bins2hdulist(m)
+    Args:
+        datfile: path to MATCH structured file.
+        fitspath: optional path or target directory of file to be created. Defaults to datfile.fit.
+        cache: optional MatchCache of parsed MATCH structures.
+        policy: optional TypePolicy choosing the format of numbers. Defaults to FORCE_FMT.
+        summary: if True, a SUMMARY BinTableHDU of per-object aggregates is added, see readsummary.
+
+    Process:
+        Compute the target FITS file's default name.
+        Compose the target FITS file from the name of the MATCH file.
+        Loads the MATCH structured file into numpy structures.
+        Creates FITS BinTableHDUs from recarrays and columns for ndarrays.
+        Saves the BinTableHDUs into a FITS file.
+
+    Returns:
+        Path to the FITS file.
+    '''
+    fitspath = fitsname(datfile, fitspath)
+
+    m = getmatch(datfile, cache=cache)
+    thdulist = bins2hdulist(m, policy, summary)
 
     # thdulist[1].name = 'MATCH'
     thdulist.writeto(fitspath, overwrite=True)
     return fitspath
 
 
-def multimatch2fits(*datfile, fitspath=None):
+def multimatch2fits(*datfile, fitspath=None, cache=None, policy=None, summary=False):
     ''' converts multiple MATCH structured files into FITS structured files.
 
     Args:
         datfile: list of paths to MATCH structured files.
         fitspath: existing target directory in which the FITS files will be created.
             If there is only 1 datfile, fitspath would be considered a target file if it is not a directory.
+        cache: optional MatchCache of parsed MATCH structures.
+        policy: optional TypePolicy choosing the format of numbers. Defaults to FORCE_FMT.
+        summary: if True, a SUMMARY BinTableHDU of per-object aggregates is added to each FITS file.
 
     Process:
         Validates that if datfile is a list of multiple files and a fits path is provided, fitspath is a directory.
@@ -344,12 +562,79 @@ def multimatch2fits(*datfile, fitspath=None):
             raise RuntimeError("fitspath must be an existing directory when converting multiple MATCH files")
 
     for match in datfile:
-        fits = match2fits(match, fitspath)
+        fits = match2fits(match, fitspath, cache=cache, policy=policy, summary=summary)
         result.append(fits)
 
     return result
 
 
+def iter_matchfiles(root, patterns=('*.dat', '*.datc')):
+    ''' walks a directory tree lazily, yielding the MATCH structured files found.
+
+    Args:
+        root: top directory of the tree.
+        patterns: glob patterns of the names of MATCH files.
+
+    Process:
+        Walks the tree top down, one directory at a time, in sorted order.
+        Yields the files whose name matches any of the patterns.
+
+    Returns:
+        Generator of paths to MATCH structured files.
+    '''
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if any(fnmatch.fnmatch(filename, pattern) for pattern in patterns):
+                yield os.path.join(dirpath, filename)
+
+
+def _convert(item, fitspath=None, **kwargs):
+    ''' converts an item of imatch2fits, a path or a (path, target) tuple.
+    '''
+    if isinstance(item, (tuple, list)):
+        item, fitspath = item
+    return match2fits(item, fitspath, **kwargs)
+
+
+def imatch2fits(datfiles, fitspath=None, workers=None, processes=True, cache=None, policy=None, summary=False):
+    ''' converts a stream of MATCH structured files into FITS structured files, yielding results as they complete.
+
+    Args:
+        datfiles: iterable of paths to MATCH structured files, or of (path, target) tuples, consumed lazily.
+            Can be a generator, such as iter_matchfiles.
+        fitspath: optional existing target directory in which the FITS files will be created,
+            for paths given without target.
+        workers: optional number of workers converting files in parallel. Files are converted in order if not given.
+        processes: if True, workers are processes, else threads.
+        cache: optional MatchCache of parsed MATCH structures.
+        policy: optional TypePolicy choosing the format of numbers. Defaults to FORCE_FMT.
+        summary: if True, a SUMMARY BinTableHDU of per-object aggregates is added to each FITS file.
+
+    Process:
+        Validates that fitspath, if provided, is a directory.
+        Converts each MATCH file, with at most twice workers files submitted and not yet yielded,
+        so memory does not grow with the number of files.
+
+    Returns:
+        Generator of (MATCH item, path to the FITS file, error) tuples. error is the exception
+        raised by the conversion, or None, and the FITS path is None on error.
+    '''
+    # validated here, when called, rather than when the generator is first iterated.
+    if fitspath is not None and not os.path.isdir(fitspath):
+        raise RuntimeError("fitspath must be an existing directory when converting a stream of MATCH files")
+
+    convert = partial(_convert, fitspath=fitspath, cache=cache, policy=policy, summary=summary)
+    return imap_bounded(convert, datfiles, workers=workers, processes=processes)
+
+
+def __getattr__(name):
+    # NUMPY2FITS is kept as a module attribute without importing astropy eagerly.
+    if name == 'NUMPY2FITS':
+        return pyfits.column.NUMPY2FITS
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
+
+
 def compare(hdu, match, value):
     vfits = hdu.data.field(value)
     print(vfits.shape)
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import itertools
+
+
+def imap_bounded(function, items, workers=None, processes=False, window=None):
+    ''' applies function to items, yielding results as they complete, with a bounded number in flight.
+
+    Args:
+        function: function of one item. Must be picklable if processes.
+        items: iterable of items, consumed lazily.
+        workers: number of workers. None or 0 applies function in the calling thread, in order.
+        processes: if True, uses processes instead of threads.
+        window: maximum number of items submitted and not yet yielded. Defaults to twice workers.
+
+    Process:
+        Submits items until window items are in flight.
+        Waits for any item to complete, yields it and submits the next item.
+
+    Returns:
+        Generator of (item, result, error) tuples. error is the exception raised by function, or None.
+    '''
+    if not workers:
+        for item in items:
+            try:
+                yield item, function(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    window = window or 2 * workers
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    items = iter(items)
+    with executor_class(max_workers=workers) as executor:
+        pending = {executor.submit(function, item): item for item in itertools.islice(items, window)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, None if error else future.result(), error
+            for item in itertools.islice(items, window - len(pending)):
+                pending[executor.submit(function, item)] = item
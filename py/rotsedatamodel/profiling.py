@@ -0,0 +1,127 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from . import match2fits as m2f
+
+# functions of match2fits whose time and allocations are reported.
+TARGETS = ('readsav', 'numpy2fits', 'array2column', 'A_size', 'field2column', 'cols2hdu', 'writeto')
+
+
+class Tracker(object):
+    ''' records calls, time and memory of wrapped functions.
+
+    Memory is measured with tracemalloc. Each call reports the peak of memory traced
+    during the call, above the memory traced when it started, and the memory it retained.
+    Nested calls reset the tracemalloc peak, and hand their peak over to their caller.
+    '''
+
+    def __init__(self):
+        self.stack = []
+        self.functions = dict()
+        self.fields = []
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'start': current, 'peak': current}
+            self.stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                current, peak = tracemalloc.get_traced_memory()
+                self.stack.pop()
+                frame['peak'] = max(frame['peak'], peak)
+                if self.stack:
+                    self.stack[-1]['peak'] = max(self.stack[-1]['peak'], frame['peak'])
+                tracemalloc.reset_peak()
+                record = self.functions.setdefault(name, {'calls': 0, 'seconds': 0., 'peak': 0, 'retained': 0})
+                record['calls'] += 1
+                record['seconds'] += elapsed
+                record['peak'] = max(record['peak'], frame['peak'] - frame['start'])
+                record['retained'] += current - frame['start']
+                if name == 'field2column':
+                    field = kwargs.get('name', args[1] if len(args) > 1 else None)
+                    self.fields.append((field, elapsed, frame['peak'] - frame['start']))
+        return wrapper
+
+
+def profile_match2fits(datfile, fitspath=None, reportdir=None, top=25, **kwargs):
+    ''' converts a MATCH structured file under cProfile and tracemalloc.
+
+    Args:
+        datfile: path to MATCH structured file.
+        fitspath: optional path or target directory of file to be created. Defaults to datfile.fit.
+        reportdir: optional directory in which the report and the cProfile stats are written.
+        top: number of functions listed in the cProfile ranking.
+        kwargs: other arguments of match2fits.
+
+    Process:
+        Wraps the TARGETS functions to record their calls, time and memory, and the time of each field.
+        Runs match2fits under cProfile with tracemalloc tracing.
+        Restores the functions.
+        Ranks the targets by time, the fields by time, and all functions by cumulative time.
+        Writes the report as datfile.profile.txt and the stats as datfile.prof in reportdir.
+
+    Returns:
+        A dict with the fits path, total seconds, peak traced bytes, targets, fields and report text.
+    '''
+    tracker = Tracker()
+    originals = {name: getattr(m2f, name) for name in TARGETS if name != 'writeto'}
+    writeto = m2f.pyfits.HDUList.writeto
+    for name, function in originals.items():
+        setattr(m2f, name, tracker.wrap(name, function))
+    m2f.pyfits.HDUList.writeto = tracker.wrap('writeto', writeto)
+
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        fits = profiler.runcall(m2f.match2fits, datfile, fitspath, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        for name, function in originals.items():
+            setattr(m2f, name, function)
+        m2f.pyfits.HDUList.writeto = writeto
+
+    targets = sorted(tracker.functions.items(), key=lambda item: item[1]['seconds'], reverse=True)
+    fields = sorted(tracker.fields, key=lambda item: item[1], reverse=True)
+
+    lines = ['{}: {:.3f}s, peak traced memory {:.1f} MB'.format(datfile, elapsed, peak / 2 ** 20), '',
+             '{:<14} {:>7} {:>10} {:>10} {:>12}'.format('function', 'calls', 'seconds', 'peak MB', 'retained MB')]
+    for name, record in targets:
+        lines.append('{:<14} {:>7} {:>10.4f} {:>10.2f} {:>12.2f}'.format(
+            name, record['calls'], record['seconds'], record['peak'] / 2 ** 20, record['retained'] / 2 ** 20))
+    lines += ['', '{:<20} {:>10} {:>10}'.format('field', 'seconds', 'peak MB')]
+    for field, seconds, fpeak in fields:
+        lines.append('{:<20} {:>10.4f} {:>10.2f}'.format(str(field), seconds, fpeak / 2 ** 20))
+    ranking = io.StringIO()
+    stats = pstats.Stats(profiler, stream=ranking)
+    stats.sort_stats('cumulative').print_stats(top)
+    lines += ['', ranking.getvalue()]
+    report = '\n'.join(lines)
+
+    if reportdir is not None:
+        os.makedirs(reportdir, exist_ok=True)
+        base = os.path.join(reportdir, os.path.basename(datfile))
+        stats.dump_stats(base + '.prof')
+        with open(base + '.profile.txt', 'w') as f:
+            f.write(report)
+
+    return {'fits': fits, 'seconds': elapsed, 'peak': peak, 'targets': dict(targets),
+            'fields': fields, 'report': report}
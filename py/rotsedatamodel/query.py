@@ -0,0 +1,184 @@
+from collections import namedtuple
+import operator
+import numpy as np
+from .io.nptools import to_native
+from .lazy import LazyModule
+from .parallel import imap_bounded
+
+pyfits = LazyModule('astropy.io.fits')
+
+# op: function of (column values, predicate value) returning a boolean mask.
+OPS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'between': lambda values, bounds: (values >= bounds[0]) & (values <= bounds[1]),
+    'anybits': lambda values, bits: (values & bits) != 0,
+    'nobits': lambda values, bits: (values & bits) == 0,
+}
+
+# fitspath: file of the rows; index: tuple of index arrays into the rows; columns: dict of name: values.
+Batch = namedtuple('Batch', ['fitspath', 'index', 'columns'])
+
+# index of the BinTableHDUs of a FITS file created by match2fits, which carry no EXTNAME.
+HDUS = {'MATCH': 1, 'STAT': 2, 'MAP': 3}
+
+
+def _field(table, name):
+    ''' reads a column of a BinTableHDU, without the record axis if the table has a single record.
+    '''
+    values = table.data.field(name)
+    return np.asarray(values[0] if len(table.data) == 1 else values)
+
+
+def _broadcast(shapes):
+    ''' broadcasts the shapes of columns.
+
+    Args:
+        shapes: dict of column name: shape.
+
+    Returns:
+        The broadcast shape.
+    '''
+    try:
+        return np.broadcast_shapes(*shapes.values())
+    except ValueError:
+        raise RuntimeError("Columns do not broadcast together: {}".format(
+            ', '.join('{} {}'.format(name, shape) for name, shape in shapes.items()))) from None
+
+
+def _broadcasts_to(shape, rows):
+    try:
+        return np.broadcast_shapes(shape, rows) == rows
+    except ValueError:
+        return False
+
+
+def _take(values, index, ndim):
+    ''' reads the elements of a column at index, broadcasting it against ndim dimensions.
+
+    Args:
+        values: column array, possibly memory-mapped, whose dimensions align with the last ones of the rows.
+        index: tuple of ndim index arrays into the rows.
+        ndim: number of dimensions of the rows.
+
+    Returns:
+        ndarray of the selected elements, in native byte order, with one element per index.
+    '''
+    count = len(index[0])
+    index = index[ndim - values.ndim:]
+    index = tuple(0 if size == 1 else i for size, i in zip(values.shape, index))
+    selected = np.asarray(values[index])
+    if selected.ndim == 0:
+        # scalar or all size-1 column: the same value for every row.
+        selected = np.full(count, selected, dtype=selected.dtype)
+    return to_native(selected)
+
+
+def queryfile(fitspath, predicates, columns=None, hdu=1, batch_size=100000):
+    ''' selects the rows of a FITS file created by match2fits that satisfy all predicates.
+
+    Rows are the elements of the broadcast shape of the columns of hdu.
+    In an hdu of a single record, such as MATCH, the record axis is dropped and columns are aligned
+    on their last axes: rows are (epoch, object) measurements, and per-object columns are broadcast over epochs.
+    In an hdu of several records, such as SUMMARY, the records are the leading axis of the rows.
+    Columns of another hdu are named 'HDU.COLUMN', e.g. 'STAT.JD', and aligned on the leading axes
+    of the rows: per-epoch STAT columns are broadcast over the objects of MATCH.
+
+    Args:
+        fitspath: path to FITS file.
+        predicates: list of (column name, op, value) tuples, op being a key of OPS.
+        columns: optional list of names of columns returned. Defaults to the columns of hdu
+            that broadcast to the rows, rows following the largest column.
+        hdu: index or name of the BinTableHDU queried. MATCH, STAT and MAP are found by position.
+        batch_size: maximum number of rows in a batch.
+
+    Process:
+        Opens the FITS file memory-mapped.
+        Evaluates the first predicate on its whole column.
+        Evaluates each following predicate only on the rows still selected.
+        Reads the returned columns only at the selected rows, a batch at a time.
+
+    Returns:
+        Generator of Batch.
+
+    Raises:
+        RuntimeError if the predicates and requested columns do not broadcast together.
+    '''
+    with pyfits.open(fitspath, memmap=True) as hdus:
+        table = hdus[HDUS.get(hdu, hdu)]
+
+        def read(name):
+            # returns the values of a column, and whether they align on the leading axes of the rows.
+            other, _, field = name.rpartition('.')
+            if other:
+                return _field(hdus[HDUS.get(other, other)], field), True
+            return _field(table, name), len(table.data) > 1
+
+        required = [name for name, _, _ in predicates] + ([] if columns is None else list(columns))
+        candidates = table.columns.names if columns is None else []
+        found = {name: read(name) for name in required + candidates}
+        # trailing axes are added to leading aligned columns so that they broadcast against the rows.
+        width = max([values.ndim for values, _ in found.values()] + [0])
+        found = {name: values.reshape(values.shape + (1,) * (width - values.ndim)) if leading else values
+                 for name, (values, leading) in found.items()}
+
+        shapes = {name: found[name].shape for name in required}
+        if columns is None:
+            # rows follow the largest column of hdu, and the columns that do not broadcast to them are skipped.
+            largest = max(candidates, key=lambda name: found[name].size)
+            shapes[largest] = found[largest].shape
+        shape = _broadcast(shapes)
+        names = columns if columns is not None else \
+            [name for name in candidates if _broadcasts_to(found[name].shape, shape)]
+        shape = shape or (1,)
+        ndim = len(shape)
+
+        index = None
+        for name, op, value in predicates:
+            values = found[name]
+            if index is None:
+                mask = np.broadcast_to(OPS[op](values, value), shape)
+                index = np.nonzero(mask)
+            else:
+                keep = OPS[op](_take(values, index, ndim), value)
+                index = tuple(i[keep] for i in index)
+        if index is None:
+            index = np.nonzero(np.ones(shape, dtype=bool))
+
+        for start in range(0, len(index[0]), batch_size):
+            bindex = tuple(i[start:start + batch_size] for i in index)
+            yield Batch(fitspath, bindex, {name: _take(found[name], bindex, ndim) for name in names})
+
+
+def queryfits(fitspaths, predicates, columns=None, hdu=1, batch_size=100000, workers=None):
+    ''' selects the rows that satisfy all predicates across FITS files created by match2fits.
+
+    Args:
+        fitspaths: iterable of paths to FITS files, consumed lazily.
+        predicates: list of (column name, op, value) tuples, op being a key of OPS.
+        columns: optional list of names of columns returned. Defaults to the columns of hdu
+            that broadcast to the rows.
+        hdu: index or name of the BinTableHDU queried.
+        batch_size: maximum number of rows in a batch.
+        workers: optional number of threads querying files in parallel.
+            Batches of a file are then yielded together, once the file is done.
+
+    Returns:
+        Generator of Batch, in file order unless workers.
+    '''
+    if not workers:
+        for fitspath in fitspaths:
+            yield from queryfile(fitspath, predicates, columns, hdu, batch_size)
+        return
+
+    def run(fitspath):
+        return list(queryfile(fitspath, predicates, columns, hdu, batch_size))
+
+    for _, batches, error in imap_bounded(run, fitspaths, workers=workers):
+        if error is not None:
+            raise error
+        yield from batches
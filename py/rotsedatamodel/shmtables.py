@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from .io.nptools import case_insensative_recarray
+from .match2fits import getmatch, bins2hdulist, fitsname
+
+# names of the BinTableHDUs created by match2fits, in order, as read by readfits.
+TABLES = ('MATCH', 'STAT', 'MAP')
+
+
+def _tracker_pid():
+    ''' pid of the resource tracker of this process, or None if it was not started here or is unknown.
+    '''
+    return resource_tracker._resource_tracker._pid
+
+
+def _attach_memory(name, tracker=None):
+    ''' attaches to an existing shared memory block without handing its ownership to this process.
+
+    Args:
+        name: name of the shared memory block.
+        tracker: pid of the resource tracker of the owner, as given by the descriptors.
+    '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # track is only available since python 3.13. Before, attaching registers the block with the
+    # resource tracker of this process, which unlinks it when this process exits. The registration
+    # is dropped, unless the tracker is the owner's: children of the owner share it, forked ones
+    # knowing its pid and spawned ones only inheriting its pipe, and unregistering there would
+    # drop the owner's own registration.
+    current = resource_tracker._resource_tracker
+    shared = current._pid == tracker if current._pid is not None else current._fd is not None
+    memory = shared_memory.SharedMemory(name=name)
+    if not shared:
+        resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
+
+
+class SharedTables(object):
+    ''' MATCH, STAT and MAP tables held as numpy recarrays in shared memory.
+
+    The process that creates the tables owns the shared memory and must unlink it when
+    analysis is done. Worker processes attach to the tables using the descriptors.
+    '''
+
+    def __init__(self, memory, tables, owner, fits=None):
+        self.memory = memory
+        self.tables = tables
+        self.owner = owner
+        self.fits = fits
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    def descriptors(self):
+        ''' creates picklable descriptions of the tables to be passed to worker processes.
+
+        Returns:
+            A list of (table name, shared memory name, dtype, shape, pid of the owner's resource tracker) tuples.
+        '''
+        tracker = _tracker_pid()
+        return [(name, self.memory[name].name, table.dtype, table.shape, tracker)
+                for name, table in self.tables.items()]
+
+    def close(self):
+        ''' releases the views and detaches from the shared memory.
+        References to the tables held elsewhere must be released first.
+        '''
+        self.tables = dict()
+        for shm in self.memory.values():
+            shm.close()
+
+    def unlink(self):
+        ''' frees the shared memory. Only the creating process should call unlink.
+        '''
+        for shm in self.memory.values():
+            shm.unlink()
+
+
+def native_dtype(dtype):
+    ''' native byte order counterpart of a column dtype; strings are kept as bytes, as stored in FITS.
+    '''
+    if dtype.kind == 'U':
+        return np.dtype('S{}'.format(dtype.itemsize // 4))
+    return dtype.newbyteorder('=')
+
+
+def hdu2shm(hdu):
+    ''' copies the data of a BinTableHDU into a native byte order recarray in shared memory.
+
+    Args:
+        hdu: FITS BinTableHDU.
+
+    Process:
+        Builds a native byte order dtype with lowercase and uppercase names from the columns.
+        String columns are kept as bytes, as when read from a FITS file.
+        Creates a shared memory block of the size of the table.
+        Copies each column into a recarray backed by the block, swapping bytes once on the way.
+
+    Returns:
+        The SharedMemory block and the recarray using it.
+    '''
+    data = hdu.data
+    fields = [(name, data.field(name)) for name in hdu.columns.names]
+    dtype = [(name, native_dtype(field.dtype), field.shape[1:]) for name, field in fields]
+    dtype = case_insensative_recarray(np.dtype(dtype))
+    shape = (len(data),)
+    shm = shared_memory.SharedMemory(create=True, size=max(dtype.itemsize * shape[0], 1))
+    table = np.recarray(shape, dtype=dtype, buf=shm.buf)
+    for name, field in fields:
+        table[name.lower()] = field
+    return shm, table
+
+
+def match2shm(datfile, fitspath=None, write=True, policy=None):
+    ''' converts a MATCH structured file into tables in shared memory, optionally writing FITS in the background.
+
+    Args:
+        datfile: path to MATCH structured file.
+        fitspath: optional path or target directory of FITS file to be created. Defaults to datfile.fit.
+        write: if True, the FITS file is written asynchronously.
+        policy: optional TypePolicy choosing the format of numbers.
+
+    Process:
+        Loads the MATCH structured file and creates its BinTableHDUs.
+        Copies the MATCH, STAT and MAP tables into shared memory.
+        Submits writing the FITS file to a background thread.
+
+    Before python 3.13, a process attaching to the tables is registered with its resource tracker,
+    which unlinks them when the tracker's processes exit. attach unregisters the tables, except in
+    processes that share the owner's tracker. Spawned processes are assumed to share it, so a process
+    spawned by an unrelated parent still hands the tables to that parent's tracker, which unlinks them
+    when that parent and its children exit: such parents should outlive the use of the tables.
+
+    Returns:
+        SharedTables owning the shared memory. Its fits attribute is a Future of the FITS path, or None.
+    '''
+    m = getmatch(datfile)
+    thdulist = bins2hdulist(m, policy)
+    tables = hdulist2shm(thdulist)
+    if write:
+        fitspath = fitsname(datfile, fitspath)
+
+        def writeto():
+            thdulist.writeto(fitspath, overwrite=True)
+            return fitspath
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        tables.fits = executor.submit(writeto)
+        executor.shutdown(wait=False)
+    return tables
+
+
+def hdulist2shm(hdulist):
+    ''' copies the MATCH, STAT and MAP BinTableHDUs of a HDUList into shared memory.
+
+    Args:
+        hdulist: HDUList created by bins2hdulist or read from a FITS file created by match2fits.
+
+    Returns:
+        SharedTables owning the shared memory.
+    '''
+    memory = dict()
+    tables = dict()
+    try:
+        for name, hdu in zip(TABLES, hdulist[1:]):
+            memory[name], tables[name] = hdu2shm(hdu)
+    except Exception:
+        for shm in memory.values():
+            shm.close()
+            shm.unlink()
+        raise
+    return SharedTables(memory, tables, owner=True)
+
+
+def attach(descriptors):
+    ''' attaches to tables in shared memory, zero-copy, from a worker process.
+
+    Args:
+        descriptors: list of descriptions returned by SharedTables.descriptors.
+
+    Returns:
+        SharedTables that do not own the shared memory.
+    '''
+    memory = dict()
+    tables = dict()
+    for name, shm_name, dtype, shape, tracker in descriptors:
+        memory[name] = _attach_memory(shm_name, tracker)
+        tables[name] = np.recarray(shape, dtype=dtype, buf=memory[name].buf)
+    return SharedTables(memory, tables, owner=False)
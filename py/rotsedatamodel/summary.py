@@ -0,0 +1,98 @@
+import numpy as np
+from .lazy import LazyModule
+from .match2fits import cols2hdu
+
+pyfits = LazyModule('astropy.io.fits')
+
+# name of the summary BinTableHDU appended by match2fits.
+SUMMARY = 'SUMMARY'
+
+# role: MATCH field holding it.
+SUMMARY_FIELDS = {
+    'ra': 'RA',
+    'dec': 'DEC',
+    'mag': 'M',
+    'flags': 'FLAGS',
+}
+
+
+def matchfield(match, name):
+    ''' fetches the array of a MATCH field, or None if the field is missing.
+    '''
+    if name not in match.dtype.names:
+        return None
+    value = match[name]
+    if value.dtype.kind == 'O':
+        value = value[0]
+    return np.asarray(value)
+
+
+def summarize(match, fields=None):
+    ''' computes per-object aggregates of the per-epoch magnitudes of a MATCH structure.
+
+    Args:
+        match: numpy recarray as returned by getmatch.
+        fields: optional dict mapping the roles ra, dec, mag and flags to MATCH fields.
+            Defaults to SUMMARY_FIELDS. flags is optional.
+
+    Process:
+        Brings magnitudes and flags to (epoch, object) shape, using the number of objects in ra.
+        Marks as good the epochs with a finite, positive magnitude and no flags set.
+        Computes the number of good epochs, and the mean, median and scatter of their magnitudes.
+
+    Returns:
+        A dict of column name: ndarray, with one element per object.
+    '''
+    fields = SUMMARY_FIELDS if fields is None else fields
+    ra = matchfield(match, fields['ra'])
+    dec = matchfield(match, fields['dec'])
+    mag = matchfield(match, fields['mag'])
+    if ra is None or dec is None or mag is None:
+        raise RuntimeError("Cannot summarize MATCH without fields: {}".format(fields))
+    flags = matchfield(match, fields['flags']) if 'flags' in fields else None
+
+    nobj = ra.shape[-1]
+    mag = mag.reshape(-1, nobj) if mag.shape[-1] == nobj else mag.reshape(nobj, -1).T
+    good = np.isfinite(mag) & (mag > 0)
+    if flags is not None:
+        flags = flags.reshape(-1, nobj) if flags.shape[-1] == nobj else flags.reshape(nobj, -1).T
+        good &= flags == 0
+
+    ngood = good.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = np.where(good, mag, 0).sum(axis=0, dtype=np.float64)
+        mean = total / ngood
+        scatter = np.sqrt(np.where(good, (mag - mean) ** 2, 0).sum(axis=0) / ngood)
+    masked = np.where(good, mag, np.nan)
+    median = np.full(nobj, np.nan)
+    some = ngood > 0
+    # nanmedian warns on objects without good epochs.
+    median[some] = np.nanmedian(masked[:, some], axis=0)
+
+    return {
+        'RA': ra.reshape(nobj),
+        'DEC': dec.reshape(nobj),
+        'NGOOD': ngood.astype(np.int32),
+        'MEAN_M': mean.astype(np.float32),
+        'MEDIAN_M': median.astype(np.float32),
+        'SIGMA_M': scatter.astype(np.float32),
+    }
+
+
+def summary2hdu(match, fields=None):
+    ''' creates the SUMMARY BinTableHDU of a MATCH structure, one row per object.
+
+    Args:
+        match: numpy recarray as returned by getmatch.
+        fields: optional dict mapping roles to MATCH fields, see summarize.
+
+    Returns:
+        BinTableHDU named SUMMARY.
+    '''
+    columns = []
+    for name, array in summarize(match, fields).items():
+        fmt = pyfits.column.NUMPY2FITS[pyfits.column._dtype_to_recformat(array.dtype)[0]]
+        columns.append(pyfits.Column(name=name, format=fmt, array=array))
+    hdu = cols2hdu(columns)
+    hdu.name = SUMMARY
+    return hdu
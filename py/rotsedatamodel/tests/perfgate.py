@@ -0,0 +1,197 @@
+'''
+Throughput regression gate of the conversion and read paths.
+
+Runs match2fits stages on deterministic synthetic MATCH data, and compares their time
+and memory with the baseline stored in perf_baseline.json. Run on a production node
+before and after upgrading astropy, numpy or scipy:
+
+    python -m rotsedatamodel.tests.perfgate --update     # record the baseline
+    python -m rotsedatamodel.tests.perfgate              # check against it
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from rotsedatamodel.match2fits import bins2hdulist
+from rotsedatamodel.io.fitstools import readfits
+from .synthetic import synthetic_match
+
+# bump when the layout of the baseline file changes.
+BASELINE_VERSION = 1
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+CONFIG = {'nobj': 20000, 'nepoch': 20, 'repeat': 5}
+# relative increase of a stage's time or memory over baseline that fails the gate.
+THRESHOLD = 0.25
+
+
+def environment():
+    ''' versions of python and of the dependencies, recorded with the baseline.
+    '''
+    import astropy
+    import scipy
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'scipy': scipy.__version__, 'astropy': astropy.__version__, 'machine': platform.machine()}
+
+
+def stages(match, workdir):
+    ''' creates the stages measured, in order; each stage is a function of no arguments.
+    '''
+    fitsfile = os.path.join(workdir, 'perfgate_match.fit')
+    state = dict()
+
+    def convert():
+        state['hdulist'] = bins2hdulist(match)
+
+    def write():
+        state['hdulist'].writeto(fitsfile, overwrite=True)
+
+    def read():
+        readfits(fitsfile)
+
+    def read_native():
+        readfits(fitsfile, native=True)
+
+    return [('bins2hdulist', convert), ('writeto', write), ('readfits', read), ('readfits_native', read_native)]
+
+
+def measure(config=None):
+    ''' measures the stages on synthetic MATCH data.
+
+    Args:
+        config: optional dict of nobj, nepoch and repeat. Defaults to CONFIG.
+
+    Process:
+        Creates the synthetic MATCH data of config.
+        Runs the stages repeat times and keeps the median time of each.
+        Runs the stages once more with tracemalloc, to get the peak memory of each.
+
+    Returns:
+        A dict of stage: {'seconds': median time, 'peak_mb': peak traced memory}.
+    '''
+    config = CONFIG if config is None else config
+    match = synthetic_match(nobj=config['nobj'], nepoch=config['nepoch'])
+    workdir = tempfile.mkdtemp()
+    try:
+        timings = dict()
+        for _ in range(config['repeat']):
+            for name, stage in stages(match, workdir):
+                start = time.perf_counter()
+                stage()
+                timings.setdefault(name, []).append(time.perf_counter() - start)
+        result = dict()
+        tracemalloc.start()
+        try:
+            for name, stage in stages(match, workdir):
+                tracemalloc.reset_peak()
+                current, _ = tracemalloc.get_traced_memory()
+                stage()
+                _, peak = tracemalloc.get_traced_memory()
+                result[name] = {'seconds': statistics.median(timings[name]), 'peak_mb': (peak - current) / 2 ** 20}
+        finally:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir)
+    return result
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    ''' compares measured stages with the baseline.
+
+    Args:
+        results: dict returned by measure.
+        baseline: content of a baseline file.
+        threshold: relative increase that is considered a regression.
+
+    Returns:
+        A list of the regressions, as (stage, metric, baseline value, measured value) tuples.
+    '''
+    regressions = []
+    for name, metrics in sorted(results.items()):
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        for metric, value in sorted(metrics.items()):
+            if value > base[metric] * (1. + threshold):
+                regressions.append((name, metric, base[metric], value))
+    return regressions
+
+
+def report(results, baseline, regressions):
+    ''' formats the comparison of measured stages with the baseline.
+    '''
+    lines = []
+    current = environment()
+    changed = {key: (value, current.get(key)) for key, value in baseline['environment'].items()
+               if current.get(key) != value}
+    for key, (before, after) in sorted(changed.items()):
+        lines.append('{}: {} -> {}'.format(key, before, after))
+    lines.append('{:<16} {:<8} {:>10} {:>10} {:>8}'.format('stage', 'metric', 'baseline', 'measured', 'change'))
+    failed = {(name, metric) for name, metric, _, _ in regressions}
+    for name, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            base = baseline['stages'].get(name, {}).get(metric)
+            change = '' if not base else '{:+.0%}'.format(value / base - 1.)
+            flag = ' REGRESSION' if (name, metric) in failed else ''
+            lines.append('{:<16} {:<8} {:>10.4f} {:>10.4f} {:>8}{}'.format(
+                name, metric, base if base is not None else float('nan'), value, change, flag))
+    return '\n'.join(lines)
+
+
+def load_baseline(path=BASELINE):
+    with open(path, 'r') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise RuntimeError("Baseline {} has version {}, expected {}".format(
+            path, baseline.get('version'), BASELINE_VERSION))
+    return baseline
+
+
+def save_baseline(results, config=None, path=BASELINE):
+    baseline = {'version': BASELINE_VERSION, 'config': CONFIG if config is None else config,
+                'environment': environment(), 'stages': results}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return baseline
+
+
+def gate(path=BASELINE, threshold=THRESHOLD):
+    ''' measures the stages with the configuration of the baseline and compares them.
+
+    Returns:
+        The list of regressions and the report.
+    '''
+    baseline = load_baseline(path)
+    results = measure(baseline['config'])
+    regressions = compare(results, baseline, threshold)
+    return regressions, report(results, baseline, regressions)
+
+
+def cmdargs():
+    parser = argparse.ArgumentParser(description="Throughput regression gate of match2fits.")
+    parser.add_argument('--update', action='store_true',
+                        help='''record the measured stages as the new baseline''')
+    parser.add_argument('--baseline', type=str, default=BASELINE,
+                        help='''path of the baseline json file''')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='''relative increase of time or memory considered a regression''')
+    return vars(parser.parse_args())
+
+
+if __name__ == '__main__':
+    args = cmdargs()
+    if args['update']:
+        save_baseline(measure(), path=args['baseline'])
+        print('Baseline saved to {}'.format(args['baseline']))
+        sys.exit(0)
+    regressions, text = gate(args['baseline'], args['threshold'])
+    print(text)
+    sys.exit(1 if regressions else 0)
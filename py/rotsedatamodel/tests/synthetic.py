@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest as ut
+import numpy as np
+from rotsedatamodel.match2fits import bins2hdulist
+
+
+def structure(fields, values):
+    ''' creates a single record recarray shaped like the structures returned by readsav.
+
+    Args:
+        fields: list of uppercase field names.
+        values: list of values (ndarrays or recarrays) matching fields.
+
+    Process:
+        Creates a dtype of object fields named by lowercase names with uppercase titles.
+        Stores each value in the single record of the recarray.
+
+    Returns:
+        A numpy recarray with one record.
+    '''
+    dtype = np.dtype([((field.lower(), field), object) for field in fields])
+    rec = np.recarray((1,), dtype=dtype)
+    for field, value in zip(fields, values):
+        rec[field.lower()][0] = value
+    return rec
+
+
+def synthetic_match(nobj=100, nepoch=10, seed=0):
+    ''' creates a deterministic MATCH structure with STAT and MAP sub structures.
+
+    Args:
+        nobj: number of objects.
+        nepoch: number of epochs.
+        seed: seed of the random generator.
+
+    Returns:
+        A numpy recarray as returned by getmatch.
+    '''
+    rng = np.random.RandomState(seed)
+    cam_id = np.array([b'cam%d' % (i % 10) for i in range(nepoch)], dtype=object)
+    stat = structure(['EXPTIME', 'CAM_ID', 'JD', 'MEDIAN'],
+                     [np.full(nepoch, 60., dtype=np.float32),
+                      cam_id,
+                      2451644.5 + np.arange(nepoch, dtype=np.float64) / 24.,
+                      rng.normal(14., 0.5, nepoch).astype(np.float32)])
+    map_ = structure(['RA', 'DEC', 'DRA', 'DDEC'],
+                     [rng.uniform(0., 360., nobj),
+                      rng.uniform(-90., 90., nobj),
+                      rng.randint(-50, 50, nobj).astype(np.float64),
+                      rng.randint(-50, 50, nobj).astype(np.float64)])
+    mags = rng.normal(15., 1., (nepoch, nobj)).astype(np.float32)
+    flags = rng.randint(0, 4, (nepoch, nobj)).astype(np.int16)
+    match = structure(['RA', 'DEC', 'M', 'MERR', 'FLAGS', 'STAT', 'MAP'],
+                      [rng.uniform(0., 360., nobj),
+                       rng.uniform(-90., 90., nobj),
+                       mags,
+                       rng.uniform(0.01, 0.2, (nepoch, nobj)).astype(np.float32),
+                       flags,
+                       stat,
+                       map_])
+    return match
+
+
+class TmpDirTestCase(ut.TestCase):
+    ''' test case with a temporary directory, self.tmpdir, removed after each test.
+    '''
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def writefits(self, match=None, name='synthetic_match.fit', summary=False):
+        ''' writes match, or a default synthetic MATCH structure, as a FITS file in self.tmpdir.
+
+        Returns:
+            Path to the FITS file.
+        '''
+        fitsfile = os.path.join(self.tmpdir, name)
+        bins2hdulist(synthetic_match() if match is None else match, summary=summary).writeto(fitsfile, overwrite=True)
+        return fitsfile
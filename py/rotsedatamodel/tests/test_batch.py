@@ -0,0 +1,62 @@
+import os
+import unittest as ut
+from unittest import mock
+from rotsedatamodel import match2fits as m2f
+from rotsedatamodel.batch import Group, matchgroup, groupdir, groupfiles, plan, batch2fits
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+class TestBatch(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.outroot = os.path.join(self.tmpdir, 'out')
+        self.files = dict()
+        for name, size in [('140904_sky0001_3b_match.datc', 10),
+                           ('140904_sky0001-0_3b_match.datc', 40),
+                           ('140904_sky0002_3b_match.datc', 20),
+                           ('140905_sky0001-0_3a_match.dat', 30)]:
+            path = os.path.join(self.tmpdir, name)
+            with open(path, 'wb') as f:
+                f.write(b'\0' * size)
+            self.files[name] = path
+
+    def test_matchgroup(self):
+        self.assertEqual(matchgroup('/data/000409_xtetrans_1a_match.dat'), Group('000409', '1a', False))
+        self.assertEqual(matchgroup('140905_sky0001-0_3a_match.dat'), Group('140905', '3a', True))
+        with self.assertRaises(RuntimeError):
+            matchgroup('match.dat')
+        with self.assertRaises(RuntimeError):
+            batch2fits(['match.dat'], self.outroot)
+
+    def test_groupdir(self):
+        self.assertEqual(groupdir('out', Group('140904', '3b', False)),
+                         os.path.join('out', 'rotse', '3b', '14', '09', '04', 'prod'))
+        self.assertEqual(groupdir('out', Group('140904', '3b', True)),
+                         os.path.join('out', 'rotse', '3b', '14', '09', '04', 'coadd', 'prod'))
+
+    def test_groupfiles(self):
+        groups = groupfiles(self.files.values())
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(len(groups[Group('140904', '3b', False)]), 2)
+
+    def test_plan(self):
+        jobs = plan(self.files.values(), self.outroot)
+        self.assertEqual([os.path.basename(datfile) for datfile, _ in jobs],
+                         ['140904_sky0001-0_3b_match.datc', '140905_sky0001-0_3a_match.dat',
+                          '140904_sky0002_3b_match.datc', '140904_sky0001_3b_match.datc'])
+        self.assertEqual(jobs[0][1], os.path.join(self.outroot, 'rotse', '3b', '14', '09', '04', 'coadd', 'prod'))
+
+    def test_batch2fits(self):
+        with mock.patch.object(m2f, 'getmatch', return_value=synthetic_match(nobj=10, nepoch=2)):
+            results = list(batch2fits(self.files.values(), self.outroot, workers=2, processes=False))
+        self.assertEqual(len(results), 4)
+        for (datfile, outdir), fits, error in results:
+            self.assertIsNone(error)
+            self.assertEqual(os.path.dirname(fits), outdir)
+            self.assertTrue(os.path.isfile(fits))
+        self.assertTrue(os.path.isfile(os.path.join(
+            self.outroot, 'rotse', '3a', '14', '09', '05', 'coadd', 'prod', '140905_sky0001-0_3a_match.fit')))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,80 @@
+import os
+import unittest as ut
+from unittest import mock
+import numpy as np
+from rotsedatamodel.io import fitstools
+from rotsedatamodel.io.nptools import to_native, byteorders
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+class TestNpyExport(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fitsfile = self.writefits()
+
+    def test_readfits_npy(self):
+        fits = fitstools.readfits(self.fitsfile)
+        self.assertIsNone(fitstools.readnpy(self.fitsfile))
+        exported = fitstools.readfits(self.fitsfile, npy=True)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmpdir, 'synthetic_match.npy')))
+        self.assertEqual(byteorders(exported.dtype), {True})
+        self.assertTrue(np.array_equal(exported['M'], fits['M']))
+        self.assertTrue(np.array_equal(exported['STAT']['CAM_ID'], fits['STAT']['CAM_ID']))
+
+        # valid exports are read without reading the FITS file.
+        with mock.patch.object(fitstools, 'pyfits') as pyfits:
+            loaded = fitstools.readfits(self.fitsfile, npy=True)
+        pyfits.open.assert_not_called()
+        self.assertIsInstance(loaded.base, np.memmap)
+
+    def test_unwritable_export(self):
+        # e.g. a read-only archive directory: the FITS file is read instead.
+        fits = fitstools.readfits(self.fitsfile)
+        with mock.patch.object(fitstools.os, 'replace', side_effect=PermissionError('read-only')):
+            loaded = fitstools.readfits(self.fitsfile, npy=True)
+        self.assertTrue(np.array_equal(loaded['M'], fits['M']))
+        self.assertEqual(os.listdir(self.tmpdir), ['synthetic_match.fit'])
+
+    def test_out_of_date_export(self):
+        cachedir = os.path.join(self.tmpdir, 'cache')
+        fitstools.exportnpy(self.fitsfile, cachedir)
+        self.assertIsNotNone(fitstools.readnpy(self.fitsfile, cachedir))
+        match = synthetic_match(seed=2)
+        self.writefits(match)
+        os.utime(self.fitsfile, ns=(0, 0))
+        self.assertIsNone(fitstools.readnpy(self.fitsfile, cachedir))
+        loaded = fitstools.readfits(self.fitsfile, npy=True, cachedir=cachedir)
+        self.assertTrue(np.array_equal(loaded['M'][0], match['M'][0]))
+
+
+class TestNative(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fitsfile = self.writefits(summary=True)
+
+    def test_readfits_native(self):
+        fits = fitstools.readfits(self.fitsfile)
+        native = fitstools.readfits(self.fitsfile, native=True)
+        self.assertEqual(byteorders(fits.dtype), {False})
+        self.assertEqual(byteorders(native.dtype), {True})
+        self.assertTrue(np.array_equal(native['M'], fits['M']))
+        self.assertTrue(np.array_equal(native['MAP']['DRA'], fits['MAP']['DRA']))
+        self.assertEqual(byteorders(fitstools.readsummary(self.fitsfile).dtype), {True})
+
+    def test_to_native(self):
+        array = np.arange(5, dtype='>f8')
+        converted = to_native(array)
+        self.assertTrue(converted.dtype.isnative)
+        self.assertTrue(np.shares_memory(array, converted))
+        self.assertTrue(np.array_equal(converted, np.arange(5)))
+        self.assertIs(to_native(converted), converted)
+
+        readonly = np.array([(1, b'a')], dtype=[('x', '>i4'), ('s', 'S1')])
+        readonly.flags.writeable = False
+        converted = to_native(readonly)
+        self.assertFalse(np.shares_memory(readonly, converted))
+        self.assertEqual(converted['x'][0], 1)
+
+
+if __name__ == '__main__':
+    ut.main()
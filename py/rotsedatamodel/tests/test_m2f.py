@@ -5,10 +5,14 @@ Created on Dec 13, 2017
 '''
 
 
+import os
 import unittest as ut
 import numpy as np
-from rotsedatamodel.match2fits import multimatch2fits, getmatch
+from unittest import mock
+from rotsedatamodel import match2fits as m2f
+from rotsedatamodel.match2fits import multimatch2fits, getmatch, bins2hdulist, A_size
 from ..io.fitstools import readfits
+from .synthetic import TmpDirTestCase, synthetic_match
 
 
 def remove_spaces(s):
@@ -77,5 +81,62 @@ class TestM2F(ut.TestCase):
         self.assertTrue(len(diff) == 0, 'Failed in field: {}'.format(diff))
 
 
+class TestStringWidth(TmpDirTestCase):
+    def test_A_size(self):
+        self.assertEqual(A_size(np.array([['a', 'abc'], ['abcde', '']])), 5)
+        self.assertEqual(A_size(np.array([b'ab', b'abcd'], dtype=object)), 4)
+        self.assertEqual(A_size(np.array([''])), 1)
+        # non-ASCII text is measured in encoded bytes.
+        self.assertEqual(A_size(np.array(['ab', 'caf\u00e9'])), 5)
+        self.assertEqual(A_size(np.array(['ab', 'caf\u00e9'], dtype=object)), 5)
+
+    def test_longer_strings_are_kept(self):
+        match = synthetic_match(nepoch=4)
+        match['STAT'][0]['CAM_ID'][0] = np.array([b'c1', b'camera2', b'cam3', b''], dtype=object)
+        fits_file = os.path.join(self.tmpdir, 'synthetic_match.fit')
+        bins2hdulist(match).writeto(fits_file)
+        fits = readfits(fits_file)
+        self.assertEqual(compare_recarray(match, fits), [])
+        self.assertEqual(list(fits['STAT']['CAM_ID'][0, 0]), [b'c1', b'camera2', b'cam3', b''])
+
+
+class TestStream(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        for night in ['000409', '000410']:
+            os.makedirs(os.path.join(self.tmpdir, night, 'prod'))
+            for name in ['sky1_1a_match.dat', 'sky2_1a_match.datc', 'sky1_1a_cobj.fit']:
+                open(os.path.join(self.tmpdir, night, 'prod', night + '_' + name), 'w').close()
+
+    def test_iter_matchfiles(self):
+        found = [os.path.relpath(path, self.tmpdir) for path in m2f.iter_matchfiles(self.tmpdir)]
+        self.assertEqual(found, [os.path.join('000409', 'prod', '000409_sky1_1a_match.dat'),
+                                 os.path.join('000409', 'prod', '000409_sky2_1a_match.datc'),
+                                 os.path.join('000410', 'prod', '000410_sky1_1a_match.dat'),
+                                 os.path.join('000410', 'prod', '000410_sky2_1a_match.datc')])
+
+    def test_imatch2fits_fitspath(self):
+        with self.assertRaises(RuntimeError):
+            m2f.imatch2fits([], fitspath=os.path.join(self.tmpdir, 'missing'))
+
+    def test_imatch2fits(self):
+        def getmatch(filename, cache=None):
+            if 'sky2' in filename:
+                raise RuntimeError("Failed to read {}".format(filename))
+            return synthetic_match(nobj=10, nepoch=2)
+
+        with mock.patch.object(m2f, 'getmatch', side_effect=getmatch):
+            results = list(m2f.imatch2fits(m2f.iter_matchfiles(self.tmpdir), workers=2, processes=False))
+        self.assertEqual(len(results), 4)
+        for datfile, fits, error in results:
+            if 'sky2' in datfile:
+                self.assertIsNone(fits)
+                self.assertIsInstance(error, RuntimeError)
+            else:
+                self.assertIsNone(error)
+                self.assertEqual(fits, datfile[:-3] + 'fit')
+                self.assertTrue(os.path.isfile(fits))
+
+
 if __name__ == '__main__':
     ut.main()
@@ -0,0 +1,65 @@
+import os
+import unittest as ut
+from unittest import mock
+import numpy as np
+from rotsedatamodel.io.matchcache import MatchCache
+from rotsedatamodel.match2fits import bins2hdulist
+from rotsedatamodel.io.nptools import array_digest
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+class TestMatchCache(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cachedir = os.path.join(self.tmpdir, 'cache')
+        self.datfiles = []
+        for i in range(3):
+            datfile = os.path.join(self.tmpdir, 'night{}_match.dat'.format(i))
+            with open(datfile, 'wb') as f:
+                f.write(b'match file %d' % i)
+            self.datfiles.append(datfile)
+
+    def test_cached_structure(self):
+        parse = mock.Mock(side_effect=lambda filename: {'match': synthetic_match(seed=1)})
+        cache = MatchCache(self.cachedir)
+        first = cache.get(self.datfiles[0], parse)['match']
+        second = cache.get(self.datfiles[0], parse)['match']
+        self.assertEqual(parse.call_count, 1)
+        self.assertIsInstance(second['M'][0], np.memmap)
+        self.assertEqual(second.dtype.fields['STAT'][2], 'stat')
+        self.assertTrue(np.array_equal(first['STAT'][0]['CAM_ID'][0], second['STAT'][0]['CAM_ID'][0]))
+        digests = [[array_digest(c.array) for c in hdu.columns] for hdu in bins2hdulist(first)[1:]]
+        cached = [[array_digest(c.array) for c in hdu.columns] for hdu in bins2hdulist(second)[1:]]
+        self.assertEqual(digests, cached)
+
+    def test_untitled_fields(self):
+        rec = np.recarray((1,), dtype=[('A', object), ('B', np.float64, (3,))])
+        rec['A'][0] = np.arange(4)
+        rec['B'][0] = [1., 2., 3.]
+        cache = MatchCache(self.cachedir)
+        cache.get(self.datfiles[0], lambda filename: {'rec': rec})
+        cached = cache.get(self.datfiles[0], mock.Mock())['rec']
+        self.assertEqual(cached.dtype.names, ('A', 'B'))
+        self.assertEqual(len(cached.dtype.fields['A']), 2)
+        self.assertTrue(np.array_equal(cached['A'][0], np.arange(4)))
+        self.assertTrue(np.array_equal(cached['B'][0], [1., 2., 3.]))
+
+    def test_lru_eviction(self):
+        parse = mock.Mock(side_effect=lambda filename: {'match': synthetic_match(nobj=1000)})
+        cache = MatchCache(self.cachedir)
+        cache.get(self.datfiles[0], parse)
+        entry_size = cache.entries()[0][1]
+        cache.max_bytes = int(entry_size * 2.5)
+        cache.get(self.datfiles[1], parse)
+        # use the first entry again, so that the second one is the least recently used.
+        first = cache.entries()[0][2]
+        os.utime(first, (0, 1e10))
+        cache.get(self.datfiles[2], parse)
+        remaining = [entrydir for _, _, entrydir in cache.entries()]
+        self.assertEqual(len(remaining), 2)
+        self.assertIn(first, remaining)
+        self.assertEqual(parse.call_count, 3)
+
+
+if __name__ == '__main__':
+    ut.main()
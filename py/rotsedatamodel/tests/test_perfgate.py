@@ -0,0 +1,48 @@
+import os
+import unittest as ut
+from . import perfgate
+from .synthetic import TmpDirTestCase
+
+
+class TestPerfGate(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.baseline = {'version': perfgate.BASELINE_VERSION, 'config': perfgate.CONFIG,
+                         'environment': perfgate.environment(),
+                         'stages': {'writeto': {'seconds': 1.0, 'peak_mb': 10.0}}}
+
+    def test_compare(self):
+        self.assertEqual(perfgate.compare({'writeto': {'seconds': 1.2, 'peak_mb': 10.0}}, self.baseline), [])
+        results = {'writeto': {'seconds': 1.5, 'peak_mb': 10.0}, 'new_stage': {'seconds': 9., 'peak_mb': 9.}}
+        regressions = perfgate.compare(results, self.baseline)
+        self.assertEqual(regressions, [('writeto', 'seconds', 1.0, 1.5)])
+        text = perfgate.report(results, self.baseline, regressions)
+        self.assertIn('REGRESSION', text)
+        self.assertIn('+50%', text)
+
+    def test_baseline_file(self):
+        path = os.path.join(self.tmpdir, 'baseline.json')
+        results = {'readfits': {'seconds': 0.1, 'peak_mb': 1.0}}
+        perfgate.save_baseline(results, path=path)
+        self.assertEqual(perfgate.load_baseline(path)['stages'], results)
+        self.assertEqual(perfgate.load_baseline(perfgate.BASELINE)['version'], perfgate.BASELINE_VERSION)
+        with open(path, 'w') as f:
+            f.write('{"version": 0}')
+        with self.assertRaises(RuntimeError):
+            perfgate.load_baseline(path)
+
+    def test_measure(self):
+        results = perfgate.measure({'nobj': 50, 'nepoch': 3, 'repeat': 1})
+        self.assertEqual(set(results), {'bins2hdulist', 'writeto', 'readfits', 'readfits_native'})
+        for metrics in results.values():
+            self.assertGreater(metrics['seconds'], 0)
+            self.assertGreaterEqual(metrics['peak_mb'], 0)
+
+    @ut.skipUnless(os.environ.get('ROTSE_PERF_GATE'), 'set ROTSE_PERF_GATE=1 to run the throughput gate')
+    def test_gate(self):
+        regressions, text = perfgate.gate()
+        self.assertEqual(regressions, [], text)
+
+
+if __name__ == "__main__":
+    ut.main()
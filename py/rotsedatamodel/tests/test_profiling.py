@@ -0,0 +1,30 @@
+import os
+import unittest as ut
+from unittest import mock
+from rotsedatamodel import match2fits as m2f
+from rotsedatamodel.profiling import profile_match2fits
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+class TestProfiling(TmpDirTestCase):
+    def test_profile_match2fits(self):
+        datfile = os.path.join(self.tmpdir, 'synthetic_match.dat')
+        scipy_io = mock.Mock()
+        scipy_io.readsav.return_value = {'match': synthetic_match()}
+        numpy2fits = m2f.numpy2fits
+        with mock.patch.object(m2f, 'scipy_io', scipy_io):
+            result = profile_match2fits(datfile, reportdir=self.tmpdir)
+        self.assertIs(m2f.numpy2fits, numpy2fits)
+        self.assertTrue(os.path.isfile(result['fits']))
+        for name in ['readsav', 'numpy2fits', 'array2column', 'A_size', 'cols2hdu', 'writeto']:
+            self.assertIn(name, result['targets'])
+        self.assertEqual(result['targets']['cols2hdu']['calls'], 3)
+        fields = [field for field, _, _ in result['fields']]
+        self.assertIn('STAT', fields)
+        self.assertIn('CAM_ID', fields)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmpdir, 'synthetic_match.dat.profile.txt')))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmpdir, 'synthetic_match.dat.prof')))
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,85 @@
+import unittest as ut
+import numpy as np
+import rotsedatamodel
+from rotsedatamodel.io.fitstools import readsummary
+from rotsedatamodel.query import queryfits
+from .synthetic import TmpDirTestCase, structure, synthetic_match
+
+
+class TestQuery(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.matches = [synthetic_match(seed=seed) for seed in range(3)]
+        self.fitsfiles = [self.writefits(match, 'synthetic{}_match.fit'.format(i))
+                          for i, match in enumerate(self.matches)]
+
+    def expected(self, match):
+        mags, flags = match['M'][0], match['FLAGS'][0]
+        ra = np.broadcast_to(match['RA'][0], mags.shape)
+        mask = (mags >= 14.) & (mags <= 15.) & ((flags & 1) == 0) & (ra < 180.)
+        return mags[mask], ra[mask]
+
+    def test_query(self):
+        predicates = [('M', 'between', (14., 15.)), ('FLAGS', 'nobits', 1), ('RA', '<', 180.)]
+        for workers in [None, 2]:
+            batches = list(queryfits(self.fitsfiles, predicates, columns=['M', 'RA'], batch_size=50, workers=workers))
+            self.assertTrue(all(len(batch.columns['M']) <= 50 for batch in batches))
+            for fitsfile, match in zip(self.fitsfiles, self.matches):
+                mags, ra = self.expected(match)
+                selected = [batch for batch in batches if batch.fitspath == fitsfile]
+                self.assertTrue(np.array_equal(np.concatenate([b.columns['M'] for b in selected]), mags))
+                self.assertTrue(np.array_equal(np.concatenate([b.columns['RA'] for b in selected]), ra))
+                epochs = np.concatenate([b.index[0] for b in selected])
+                objects = np.concatenate([b.index[1] for b in selected])
+                self.assertTrue(np.array_equal(match['M'][0][epochs, objects], mags))
+
+    def test_query_summary(self):
+        fitsfile = self.writefits(self.matches[0], name='synthetic_summary.fit', summary=True)
+        summary = readsummary(fitsfile)
+        batches = list(queryfits([fitsfile], [('NGOOD', '>=', 0)], hdu='SUMMARY'))
+        self.assertEqual(len(batches), 1)
+        self.assertTrue(np.array_equal(batches[0].columns['RA'], summary['RA']))
+        self.assertTrue(np.array_equal(batches[0].index[0], np.arange(len(summary))))
+
+        batches = list(queryfits([fitsfile], [('MEAN_M', '<', 15.)], columns=['DEC'], hdu='SUMMARY'))
+        self.assertTrue(np.array_equal(batches[0].columns['DEC'], summary['DEC'][summary['MEAN_M'] < 15.]))
+
+    def test_query_stat(self):
+        match = self.matches[0]
+        jd = match['STAT'][0]['JD'][0]
+        window = (jd[2], jd[5])
+        predicates = [('STAT.JD', 'between', window), ('M', '<', 15.)]
+        batches = list(queryfits(self.fitsfiles[:1], predicates, columns=['M', 'STAT.JD']))
+        mags = match['M'][0]
+        mask = ((jd >= window[0]) & (jd <= window[1]))[:, None] & (mags < 15.)
+        epochs = np.concatenate([b.index[0] for b in batches])
+        self.assertTrue(np.array_equal(np.concatenate([b.columns['M'] for b in batches]), mags[mask]))
+        self.assertTrue(np.array_equal(np.concatenate([b.columns['STAT.JD'] for b in batches]), jd[epochs]))
+
+    def test_query_broadcast(self):
+        # a per-epoch field of MATCH does not broadcast against (epoch, object) rows, a scalar does.
+        match = self.matches[0]
+        fields = ['RA', 'DEC', 'M', 'MERR', 'FLAGS', 'STAT', 'MAP']
+        nepoch = match['M'][0].shape[0]
+        extra = structure(fields + ['AIRMASS', 'ZP'], [match[field][0] for field in fields] +
+                          [np.linspace(1., 2., nepoch).astype(np.float32), np.array(25., dtype=np.float32)])
+        fitsfile = self.writefits(extra, name='synthetic_extra.fit')
+        batches = list(queryfits([fitsfile], [('M', '<', 15.)], batch_size=50))
+        self.assertEqual(sorted(batches[0].columns), ['DEC', 'FLAGS', 'M', 'MERR', 'RA', 'ZP'])
+        for batch in batches:
+            self.assertEqual(batch.columns['ZP'].shape, batch.columns['M'].shape)
+            self.assertTrue(np.all(batch.columns['ZP'] == 25.))
+        with self.assertRaises(RuntimeError):
+            list(queryfits([fitsfile], [('M', '<', 15.)], columns=['AIRMASS']))
+
+    def test_api(self):
+        # the function is returned, not the submodule of the same package, on every lookup.
+        for _ in range(2):
+            self.assertIs(rotsedatamodel.queryfits, queryfits)
+        for name in rotsedatamodel.API:
+            self.assertTrue(callable(getattr(rotsedatamodel, name)), name)
+            self.assertTrue(callable(getattr(rotsedatamodel, name)), name)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,68 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import os
+import pickle
+import subprocess
+import sys
+import unittest as ut
+from unittest import mock
+import numpy as np
+from rotsedatamodel.match2fits import bins2hdulist
+from rotsedatamodel.io.fitstools import readfits
+from rotsedatamodel.io.nptools import byteorders
+from rotsedatamodel import shmtables
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+def mean_magnitude(descriptors):
+    # runs in a worker process
+    tables = shmtables.attach(descriptors)
+    result = float(tables['MATCH']['M'].mean())
+    tables.close()
+    return result
+
+
+class TestSharedTables(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.match = synthetic_match()
+
+    def test_match2shm(self):
+        fitsfile = os.path.join(self.tmpdir, 'synthetic_match.fit')
+        with mock.patch.object(shmtables, 'getmatch', return_value=self.match):
+            tables = shmtables.match2shm('synthetic_match.dat', fitspath=fitsfile)
+        with tables:
+            self.assertEqual(tables.fits.result(), fitsfile)
+            fits = readfits(fitsfile)
+            self.assertEqual(byteorders(tables['MATCH'].dtype), {True})
+            self.assertTrue(np.array_equal(tables['MATCH']['m'], fits['M']))
+            self.assertTrue(np.array_equal(tables['STAT']['CAM_ID'], fits['STAT']['CAM_ID'][:, 0]))
+            self.assertTrue(np.array_equal(tables['MAP']['RA'], fits['MAP']['RA'][:, 0]))
+
+    def test_attach_from_worker(self):
+        with shmtables.hdulist2shm(bins2hdulist(self.match)) as tables:
+            expected = float(tables['MATCH']['M'].mean())
+            with mp.get_context('spawn').Pool(1) as pool:
+                result = pool.apply(mean_magnitude, (tables.descriptors(),))
+            self.assertEqual(result, expected)
+
+    def test_attach_from_unrelated_process(self):
+        # a process with its own resource tracker must not unlink the tables when it exits.
+        with shmtables.hdulist2shm(bins2hdulist(self.match)) as tables:
+            descriptors = os.path.join(self.tmpdir, 'descriptors.pkl')
+            with open(descriptors, 'wb') as f:
+                pickle.dump(tables.descriptors(), f)
+            # stopping the resource tracker waits for it to clean up what it tracks.
+            script = ('import pickle; from multiprocessing import resource_tracker; '
+                      'from rotsedatamodel import shmtables; '
+                      'shmtables.attach(pickle.load(open({!r}, "rb"))).close(); '
+                      'resource_tracker._resource_tracker._stop()'.format(descriptors))
+            pydir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join([pydir, os.environ.get('PYTHONPATH', '')]))
+            subprocess.check_call([sys.executable, '-c', script], env=env)
+            for _, shm_name, _, _, _ in tables.descriptors():
+                shared_memory.SharedMemory(name=shm_name).close()
+
+
+if __name__ == '__main__':
+    ut.main()
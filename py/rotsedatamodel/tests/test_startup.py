@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+import unittest as ut
+
+# seconds allowed for importing rotsedatamodel.match2fits in a fresh interpreter.
+IMPORT_BUDGET = float(os.environ.get('ROTSE_IMPORT_BUDGET', '1.0'))
+
+STARTUP = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in ('astropy', 'scipy') if m in sys.modules)
+print(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+'''
+
+
+def startup(module):
+    ''' imports module in a fresh interpreter.
+
+    Returns:
+        A dict with the import time in seconds and the heavy dependencies that were loaded.
+    '''
+    pydir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([pydir, os.environ.get('PYTHONPATH', '')]))
+    out = subprocess.check_output([sys.executable, '-c', STARTUP.format(module=module)], env=env)
+    return json.loads(out.decode())
+
+
+class TestStartup(ut.TestCase):
+    def test_import_match2fits(self):
+        result = startup('rotsedatamodel.match2fits')
+        self.assertEqual(result['heavy'], [])
+        self.assertLess(result['elapsed'], IMPORT_BUDGET,
+                        'import took {:.3f}s'.format(result['elapsed']))
+
+    def test_import_api(self):
+        for module in ['rotsedatamodel', 'rotsedatamodel.io.fitstools', 'rotsedatamodel.verify',
+                       'rotsedatamodel.shmtables']:
+            result = startup(module)
+            self.assertEqual(result['heavy'], [], module)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,30 @@
+import unittest as ut
+import numpy as np
+from rotsedatamodel.io.fitstools import readfits, readsummary
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+class TestSummary(TmpDirTestCase):
+    def test_summary_hdu(self):
+        match = synthetic_match()
+        mags = match['M'][0]
+        mags[:, 0] = np.nan
+        fitsfile = self.writefits(match, summary=True)
+
+        summary = readsummary(fitsfile)
+        good = (match['FLAGS'][0] == 0) & np.isfinite(mags)
+        self.assertEqual(len(summary), mags.shape[1])
+        self.assertTrue(np.array_equal(summary['NGOOD'], good.sum(axis=0)))
+        self.assertEqual(summary['NGOOD'][0], 0)
+        self.assertTrue(np.isnan(summary['MEAN_M'][0]))
+        self.assertAlmostEqual(summary['MEAN_M'][1], mags[good[:, 1], 1].mean(), places=5)
+        self.assertAlmostEqual(summary['MEDIAN_M'][1], np.median(mags[good[:, 1], 1]), places=5)
+        self.assertAlmostEqual(summary['SIGMA_M'][1], mags[good[:, 1], 1].std(), places=5)
+        self.assertTrue(np.array_equal(summary['RA'], match['RA'][0]))
+
+        # MATCH, STAT and MAP are read as before.
+        self.assertEqual(readfits(fitsfile)['M'].shape, (1,) + mags.shape)
+
+
+if __name__ == '__main__':
+    ut.main()
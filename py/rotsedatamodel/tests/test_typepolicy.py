@@ -0,0 +1,56 @@
+import unittest as ut
+from unittest import mock
+import numpy as np
+from rotsedatamodel import match2fits as m2f
+from rotsedatamodel.match2fits import bins2hdulist, fits_cast, TypePolicy, DOWNCAST
+from .synthetic import synthetic_match
+
+
+def formats(hdulist):
+    return {(i, column.name): column.format for i, hdu in enumerate(hdulist[1:], 1) for column in hdu.columns}
+
+
+class TestTypePolicy(ut.TestCase):
+    def test_fits_cast(self):
+        self.assertEqual(fits_cast(np.array([1., -2.]), 'J').dtype, np.int32)
+        self.assertIsNone(fits_cast(np.array([1.5]), 'J'))
+        self.assertIsNone(fits_cast(np.array([np.nan]), 'J'))
+        self.assertIsNone(fits_cast(np.array([2 ** 40]), 'J'))
+        self.assertEqual(fits_cast(np.array([1e30, np.nan]), 'E').dtype, np.float32)
+        self.assertIsNone(fits_cast(np.array([1e300]), 'E'))
+        self.assertIsNone(fits_cast(np.array([2 ** 25 + 1]), 'E'))
+        self.assertEqual(fits_cast(np.array([1], dtype=np.float32), 'D').dtype, np.float64)
+
+    def test_fits_cast_chunks(self):
+        data = np.arange(100.).reshape(10, 10)
+        with mock.patch.object(m2f, 'CAST_CHUNK', 7):
+            self.assertEqual(fits_cast(data, 'J').dtype, np.int32)
+            data[9, 9] = 0.5
+            self.assertIsNone(fits_cast(data, 'J'))
+            data[9, 9] = 1e300
+            self.assertIsNone(fits_cast(data, 'E'))
+
+    def test_force_fmt(self):
+        match = synthetic_match()
+        result = formats(bins2hdulist(match))
+        self.assertEqual(result[(3, 'DRA')], '100J')
+        # float32 EXPTIME is not widened to its FORCE_FMT format unless asked.
+        self.assertEqual(result[(2, 'EXPTIME')], '10E')
+        self.assertEqual(formats(bins2hdulist(match, TypePolicy(widen=True)))[(2, 'EXPTIME')], '10D')
+        self.assertEqual(formats(bins2hdulist(match, TypePolicy({})))[(3, 'DRA')], '100D')
+
+        # not integral, DRA keeps its format.
+        match['MAP'][0]['DRA'][0][0] = 0.5
+        self.assertEqual(formats(bins2hdulist(match))[(3, 'DRA')], '100D')
+
+    def test_downcast(self):
+        policy = TypePolicy(fields={'JD': 'D'}, downcast=DOWNCAST)
+        hdulist = bins2hdulist(synthetic_match(), policy)
+        result = formats(hdulist)
+        self.assertEqual(result[(1, 'RA')], '100E')
+        self.assertEqual(result[(2, 'JD')], '10D')
+        self.assertEqual(hdulist[1].data.field('RA').dtype, np.float32)
+
+
+if __name__ == '__main__':
+    ut.main()
@@ -0,0 +1,51 @@
+import unittest as ut
+from unittest import mock
+from astropy.io import fits as pyfits
+from rotsedatamodel import match2fits as m2f
+from rotsedatamodel import verify
+from rotsedatamodel.match2fits import bins2hdulist
+from .synthetic import TmpDirTestCase, synthetic_match
+
+
+class TestVerify(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.match = synthetic_match()
+        self.fitsfile = self.writefits(self.match)
+
+    def test_verify_all_columns(self):
+        diff = verify.verifyfits(self.fitsfile, sample=None)
+        self.assertEqual(diff, [])
+
+    def test_verify_detects_corruption(self):
+        with pyfits.open(self.fitsfile, mode='update') as hdus:
+            hdus[1].data.field('m')[0, 0, 0] += 1.
+        self.assertEqual(verify.verifyfits(self.fitsfile), [(1, 'M')])
+        # header only verification reads no data.
+        self.assertEqual(verify.verifyfits(self.fitsfile, sample=0), [])
+
+    def test_verify_against_match(self):
+        changed = synthetic_match()
+        changed['stat'][0]['exptime'][0][0] = 30.
+        with mock.patch.object(verify, 'getmatch', return_value=self.match):
+            self.assertEqual(verify.verifyfits(self.fitsfile, datfile='same.dat'), [])
+        with mock.patch.object(verify, 'getmatch', return_value=changed):
+            self.assertEqual(verify.verifyfits(self.fitsfile, datfile='changed.dat'), [(2, 'EXPTIME')])
+
+    def test_recarray_digests(self):
+        hdulist = bins2hdulist(self.match)
+        self.assertEqual(m2f.recarray_digests(self.match), [verify.header_digests(hdu) for hdu in hdulist[1:]])
+
+    def test_verify_against_match_without_tables(self):
+        with mock.patch.object(verify, 'getmatch', return_value=self.match), \
+                mock.patch.object(m2f, 'cols2hdu', side_effect=AssertionError('converted')):
+            self.assertEqual(verify.verifyfits(self.fitsfile, datfile='same.dat', sample=0), [])
+
+    def test_verify_summary_against_match(self):
+        fitsfile = self.writefits(self.match, name='synthetic_summary.fit', summary=True)
+        with mock.patch.object(verify, 'getmatch', return_value=self.match):
+            self.assertEqual(verify.verifyfits(fitsfile, datfile='same.dat', sample=None), [])
+
+
+if __name__ == '__main__':
+    ut.main()
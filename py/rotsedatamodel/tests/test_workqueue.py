@@ -0,0 +1,73 @@
+import os
+import time
+import unittest as ut
+from unittest import mock
+from rotsedatamodel import workqueue
+from .synthetic import TmpDirTestCase
+
+
+def fake_match2fits(datfile, fitspath=None, cache=None, summary=False):
+    if 'bad' in datfile:
+        raise RuntimeError("Failed to convert {}".format(datfile))
+    return datfile[:-3] + 'fit'
+
+
+class TestWorkQueue(TmpDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.queuedir = os.path.join(self.tmpdir, 'queue')
+        self.datfiles = [os.path.join(self.tmpdir, name) for name in
+                         ['000409_a_match.dat', '000409_bad_match.dat', '000409_c_match.dat']]
+
+    def test_work(self):
+        added = workqueue.enqueue(self.queuedir, *self.datfiles)
+        self.assertEqual(len(added), 3)
+        self.assertEqual(workqueue.enqueue(self.queuedir, *self.datfiles), [])
+        with mock.patch.object(workqueue, 'match2fits', side_effect=fake_match2fits):
+            result = workqueue.work(self.queuedir, worker='node1', retries=2)
+        states = dict(result)
+        self.assertEqual(states[self.datfiles[0]], 'done')
+        self.assertEqual(states[self.datfiles[2]], 'done')
+        self.assertEqual(len(result), 4)
+        self.assertEqual(workqueue.status(self.queuedir), {'pending': 0, 'claimed': 0, 'done': 2, 'failed': 1})
+        failed = os.path.join(self.queuedir, 'failed', workqueue.taskname(self.datfiles[1]))
+        task = workqueue._read(failed)
+        self.assertEqual(task['attempts'], 2)
+        self.assertIn('Failed to convert', task['errors'][-1]['error'])
+
+    def test_work_summary(self):
+        workqueue.enqueue(self.queuedir, self.datfiles[0], summary=True)
+        with mock.patch.object(workqueue, 'match2fits', side_effect=fake_match2fits) as convert:
+            workqueue.work(self.queuedir, worker='node1')
+        self.assertTrue(convert.call_args.kwargs['summary'])
+
+    def test_interval_below_stale(self):
+        with self.assertRaises(RuntimeError):
+            workqueue.work(self.queuedir, stale=30., interval=60.)
+
+    def test_recover_stale_claim(self):
+        workqueue.enqueue(self.queuedir, self.datfiles[0])
+        claimed = workqueue.claim(self.queuedir, 'node1')
+        self.assertIsNone(workqueue.claim(self.queuedir, 'node2'))
+        self.assertEqual(workqueue.recover(self.queuedir, stale=60.), [])
+        time.sleep(0.01)
+        recovered = workqueue.recover(self.queuedir, stale=0.)
+        self.assertEqual(recovered, [workqueue.taskname(self.datfiles[0])])
+        self.assertFalse(os.path.exists(claimed))
+        with mock.patch.object(workqueue, 'match2fits', side_effect=fake_match2fits):
+            result = workqueue.work(self.queuedir, worker='node2')
+        self.assertEqual(result, [(self.datfiles[0], 'done')])
+
+    def test_wait_for_claim_of_dead_worker(self):
+        workqueue.enqueue(self.queuedir, *self.datfiles[::2])
+        workqueue.claim(self.queuedir, 'dead')
+        start = time.time()
+        with mock.patch.object(workqueue, 'match2fits', side_effect=fake_match2fits):
+            result = workqueue.work(self.queuedir, worker='node2', stale=0.5, interval=0.05)
+        self.assertGreaterEqual(time.time() - start, 0.5)
+        self.assertEqual(sorted(result), [(self.datfiles[0], 'done'), (self.datfiles[2], 'done')])
+        self.assertEqual(workqueue.status(self.queuedir), {'pending': 0, 'claimed': 0, 'done': 2, 'failed': 0})
+
+
+if __name__ == '__main__':
+    ut.main()
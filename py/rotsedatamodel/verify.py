@@ -0,0 +1,77 @@
+import random
+from .io.nptools import array_digest
+from .lazy import LazyModule
+from .match2fits import DIGEST_KEY, getmatch, recarray_digests
+from .summary import SUMMARY, summarize
+
+pyfits = LazyModule('astropy.io.fits')
+
+
+def header_digests(hdu):
+    ''' fetches the per-column digests stored by match2fits in a BinTableHDU header.
+
+    Args:
+        hdu: FITS BinTableHDU.
+
+    Returns:
+        A list of (column name, digest) tuples. digest is None if the card is missing.
+    '''
+    digests = []
+    for i, name in enumerate(hdu.columns.names, 1):
+        keyword = '{}{}'.format(DIGEST_KEY, i)
+        digests.append((name, hdu.header.get(keyword)))
+    return digests
+
+
+def verifyfits(fitspath, datfile=None, sample=None, seed=None, policy=None):
+    ''' verifies a FITS file created by match2fits, using the digests stored in its headers.
+
+    Args:
+        fitspath: path to FITS file.
+        datfile: optional path to the MATCH structured file fitspath was created from.
+        sample: number of columns whose data is read from fitspath and checked against their digest.
+            None, the default, checks all the columns. 0 only checks that digests are present,
+            and against datfile if given, without reading any data.
+        seed: optional seed for choosing the sampled columns.
+        policy: optional TypePolicy datfile was converted with.
+
+    Process:
+        Reads the digests from the header of each BinTableHDU.
+        If datfile is provided, computes the digests of its columns, and of its SUMMARY table if fitspath
+        has one, without creating FITS tables, and compares them with the stored ones.
+        Spot checks sampled columns by computing the digest of their data in fitspath.
+
+    Returns:
+        A list of (HDU index, column name) tuples of the columns that failed verification.
+    '''
+    different = []
+    with pyfits.open(fitspath, memmap=True) as hdus:
+        tables = [(index, hdu) for index, hdu in enumerate(hdus) if isinstance(hdu, pyfits.BinTableHDU)]
+        stored = dict()
+        for index, hdu in tables:
+            for name, digest in header_digests(hdu):
+                stored[(index, name)] = digest
+                if digest is None:
+                    different.append((index, name))
+
+        if datfile is not None:
+            match = getmatch(datfile)
+            source = recarray_digests(match, policy)
+            if any(hdu.name == SUMMARY for _, hdu in tables):
+                source.append([(name, array_digest(array)) for name, array in summarize(match).items()])
+            expected = dict()
+            for index, digests in enumerate(source, 1):
+                for name, digest in digests:
+                    expected[(index, name)] = digest
+            for key in sorted(set(stored) | set(expected)):
+                if key not in different and stored.get(key) != expected.get(key):
+                    different.append(key)
+
+        checkable = [key for key in sorted(stored) if key not in different]
+        if sample is not None:
+            checkable = random.Random(seed).sample(checkable, min(sample, len(checkable)))
+        for index, name in checkable:
+            data = hdus[index].data.field(name)
+            if array_digest(data) != stored[(index, name)]:
+                different.append((index, name))
+    return different
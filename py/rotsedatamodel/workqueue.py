@@ -0,0 +1,280 @@
+'''
+A work queue of MATCH files to convert, kept in a directory of a shared filesystem.
+
+Each task is a small json file that moves between the state directories of the queue
+with atomic renames, so that workers on several nodes can share the queue without
+any other service:
+
+    pending/  tasks waiting for a worker.
+    claimed/  tasks being converted, renamed to name@worker by the worker that claimed them.
+    done/     converted tasks, with the path of the FITS file.
+    failed/   tasks that failed retries times, with their errors.
+'''
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from .match2fits import match2fits
+
+STATES = ('pending', 'claimed', 'done', 'failed')
+TMP = 'tmp'
+
+
+def _statedir(queuedir, state):
+    return os.path.join(queuedir, state)
+
+
+def _write(queuedir, state, name, task):
+    ''' writes a task file into a state directory atomically, through the queue's tmp directory.
+    '''
+    tmpfile = os.path.join(queuedir, TMP, '{}.{}.{}'.format(name, socket.gethostname(), os.getpid()))
+    with open(tmpfile, 'w') as f:
+        json.dump(task, f)
+    os.rename(tmpfile, os.path.join(_statedir(queuedir, state), name))
+
+
+def _read(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def taskname(datfile):
+    ''' name of the task of a MATCH file, unique to its absolute path.
+    '''
+    datfile = os.path.abspath(datfile)
+    key = hashlib.sha1(datfile.encode()).hexdigest()[:12]
+    return '{}.{}.json'.format(os.path.basename(datfile).replace('@', '_'), key)
+
+
+def workername():
+    ''' default name of a worker, unique across nodes.
+    '''
+    return '{}.{}'.format(socket.gethostname(), os.getpid())
+
+
+def makequeue(queuedir):
+    ''' creates the state directories of a queue, if missing.
+    '''
+    for state in STATES + (TMP,):
+        os.makedirs(_statedir(queuedir, state), exist_ok=True)
+
+
+def status(queuedir):
+    ''' counts the tasks of a queue.
+
+    Returns:
+        A dict of state: number of tasks.
+    '''
+    return {state: len(os.listdir(_statedir(queuedir, state))) for state in STATES}
+
+
+def enqueue(queuedir, *datfile, fitspath=None, summary=False):
+    ''' adds MATCH files to a queue.
+
+    Args:
+        queuedir: directory of the queue on a shared filesystem.
+        datfile: list of paths to MATCH structured files.
+        fitspath: optional existing target directory in which the FITS files will be created.
+        summary: if True, a SUMMARY BinTableHDU of per-object aggregates is added to each FITS file.
+
+    Process:
+        Creates the queue directories if missing.
+        Skips MATCH files that already have a task in any state.
+        Writes a pending task for each other MATCH file.
+
+    Returns:
+        List of names of the tasks added.
+    '''
+    if fitspath is not None:
+        if not os.path.isdir(fitspath):
+            raise RuntimeError("fitspath must be an existing directory when queueing MATCH files")
+        fitspath = os.path.abspath(fitspath)
+
+    makequeue(queuedir)
+    known = set()
+    for state in STATES:
+        for name in os.listdir(_statedir(queuedir, state)):
+            known.add(name.rpartition('@')[0] or name)
+
+    result = []
+    for match in datfile:
+        name = taskname(match)
+        if name in known:
+            continue
+        task = {'datfile': os.path.abspath(match), 'fitspath': fitspath, 'summary': summary,
+                'attempts': 0, 'errors': []}
+        _write(queuedir, 'pending', name, task)
+        known.add(name)
+        result.append(name)
+    return result
+
+
+def claim(queuedir, worker):
+    ''' claims a pending task by renaming it into the claimed directory.
+
+    Returns:
+        Path of the claimed task file, or None if there are no pending tasks.
+    '''
+    pending = _statedir(queuedir, 'pending')
+    for name in sorted(os.listdir(pending)):
+        claimed = os.path.join(_statedir(queuedir, 'claimed'), '{}@{}'.format(name, worker))
+        try:
+            os.rename(os.path.join(pending, name), claimed)
+        except FileNotFoundError:
+            # claimed by another worker
+            continue
+        os.utime(claimed)
+        return claimed
+    return None
+
+
+def release(queuedir, claimed, task=None, error=None, retries=3, result=None):
+    ''' moves a claimed task to done, or back to pending or to failed if conversion failed.
+
+    Args:
+        queuedir: directory of the queue.
+        claimed: path of the claimed task file.
+        task: optional content of the task, as read when claimed. Defaults to reading claimed.
+        error: error message if conversion failed, else None.
+        retries: number of attempts before a task is considered failed.
+        result: information recorded with a done task.
+
+    Returns:
+        The state into which the task was moved.
+    '''
+    name, _, worker = os.path.basename(claimed).rpartition('@')
+    if task is None:
+        task = _read(claimed)
+    if error is None:
+        task.update(result or {})
+        task['worker'] = worker
+        state = 'done'
+    else:
+        task['attempts'] += 1
+        task['errors'].append({'worker': worker, 'error': error})
+        state = 'pending' if task['attempts'] < retries else 'failed'
+    _write(queuedir, state, name, task)
+    try:
+        os.remove(claimed)
+    except FileNotFoundError:
+        pass
+    if state == 'done':
+        try:
+            # a claim recovered as stale may have been queued again meanwhile.
+            os.remove(os.path.join(_statedir(queuedir, 'pending'), name))
+        except FileNotFoundError:
+            pass
+    return state
+
+
+def recover(queuedir, stale=600., retries=3):
+    ''' returns claimed tasks whose worker stopped sending heartbeats to pending.
+
+    Args:
+        queuedir: directory of the queue.
+        stale: seconds since the last heartbeat after which a claim is considered stale.
+        retries: number of attempts before a task is considered failed.
+
+    Process:
+        Takes over each stale claim by renaming it into the queue's tmp directory.
+        Counts the stale claim as a failed attempt and releases it.
+
+    Returns:
+        List of names of the tasks recovered.
+    '''
+    claimeddir = _statedir(queuedir, 'claimed')
+    now = time.time()
+    result = []
+    for claimed in os.listdir(claimeddir):
+        path = os.path.join(claimeddir, claimed)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        # rename updates ctime; heartbeats update mtime.
+        if now - max(st.st_mtime, st.st_ctime) < stale:
+            continue
+        takeover = os.path.join(queuedir, TMP, claimed)
+        try:
+            os.rename(path, takeover)
+        except FileNotFoundError:
+            # recovered by another worker
+            continue
+        release(queuedir, takeover, error='stale claim', retries=retries)
+        result.append(claimed.rpartition('@')[0])
+    return result
+
+
+def heartbeat(claimed, interval, stop):
+    ''' touches a claimed task file every interval seconds until stop is set.
+    '''
+    while not stop.wait(interval):
+        try:
+            os.utime(claimed)
+        except FileNotFoundError:
+            return
+
+
+def work(queuedir, worker=None, retries=3, stale=600., interval=None, cache=None):
+    ''' converts tasks from a queue until no pending or recoverable claimed tasks are left.
+
+    Args:
+        queuedir: directory of the queue on a shared filesystem.
+        worker: optional name of the worker. Defaults to host.pid.
+        retries: number of attempts before a task is considered failed.
+        stale: seconds without heartbeat after which claims of other workers are recovered.
+        interval: seconds between heartbeats of the claimed task. Must be less than stale,
+            so that live claims are not recovered. Defaults to a third of stale, at most 60.
+        cache: optional MatchCache of parsed MATCH structures.
+
+    Process:
+        Recovers stale claims.
+        Claims a pending task and converts its MATCH file while sending heartbeats.
+        Releases the task as done, or as failed with the error.
+        When no task is pending but others are claimed, polls every interval seconds for up to stale
+        seconds, so that the claims of workers that died are recovered even after all others exited.
+
+    Returns:
+        List of (path of MATCH file, state into which its task was moved) tuples.
+    '''
+    interval = min(60., stale / 3.) if interval is None else interval
+    if interval >= stale:
+        raise RuntimeError("Heartbeat interval {} must be less than stale {}".format(interval, stale))
+    worker = worker or workername()
+    makequeue(queuedir)
+    claimeddir = _statedir(queuedir, 'claimed')
+    result = []
+    idle = None
+    while True:
+        recover(queuedir, stale=stale, retries=retries)
+        claimed = claim(queuedir, worker)
+        if claimed is None:
+            idle = time.time() if idle is None else idle
+            waited = time.time() - idle
+            if not os.listdir(claimeddir) or waited >= stale:
+                break
+            time.sleep(min(interval, stale - waited))
+            continue
+        idle = None
+        task = _read(claimed)
+        stop = threading.Event()
+        beat = threading.Thread(target=heartbeat, args=(claimed, interval, stop), daemon=True)
+        beat.start()
+        start = time.time()
+        error = None
+        info = None
+        try:
+            fits = match2fits(task['datfile'], task['fitspath'], cache=cache, summary=task.get('summary', False))
+            info = {'fits': fits, 'elapsed': time.time() - start}
+        except Exception:
+            error = traceback.format_exc()
+        finally:
+            stop.set()
+            beat.join()
+        state = release(queuedir, claimed, task=task, error=error, retries=retries, result=info)
+        result.append((task['datfile'], state))
+    return result
@@ -112,6 +112,8 @@ setup_info = {
                  ' resource pool utilities os ssh xml excel mail'),
     'packages': packages,
     'scripts': scripts,
+    # tracemalloc.reset_peak, used by profiling, needs python 3.9.
+    'python_requires': '>=3.9',
     'install_requires': required,
     'extras_require': {'dev': [], 'test': []},
     'classifiers': [
@@ -123,10 +125,11 @@ setup_info = {
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
+        'Programming Language :: Python :: 3.13',
         'Topic :: Software Development :: Libraries :: Application '
         'Frameworks',
         'Topic :: Software Development :: Libraries :: Python '